@@ -0,0 +1,178 @@
+#JMP:xkovar66
+''' Rozhrani pro pouziti makroprocesoru z jinych programu v Pythonu. Nevyzaduje konfiguraci
+ve tvaru argumentu prikazove radky ani praci se soubory: vstupem je retezec nebo iterovatelny
+objekt useku textu, vystup je vracen po usecich hned, jakmile je konecny.
+  
+  for chunk in api.expand(chunks, restrict=True):
+    response.write(chunk)
+
+Vysledky celych dokumentu lze ukladat do trvale cache (expandText s results.ResultCache).
+
+Pro asyncio slouzi aexpand a expandAsync. Zpracovani pouziva tutez tridu Processor, po castech
+o steps lexikalnich jednotkach, mezi kterymi je rizeni vraceno smycce udalosti. Zpracovani lze
+tak zrusit (cancel) nebo omezit casem.
+
+Chyby zpracovani jsou vyhazovany jako vyjimky modulu processor a macro (navratovy kod
+prikazove radky k nim vraci funkce config.errorCode). '''
+
+import asyncio
+
+import config
+import library
+import results
+from processor import Processor, ListSink, ChunkFeed, InputUnderflow
+
+
+def createProcessor(cmd="", restrict=False, libraryPath=None, limits=None, engine='text'):
+  ''' Vytvori instanci tridy Processor s danymi volbami (viz jmp.py --help): retezec cmd vlozeny
+  pred vstup, zakaz redefinice maker restrict, soubor knihovny maker, n-tice limitu zdroju
+  (argumenty processor.Governor) a lexikalni analyzator. '''
+  cfg = config.defaults()
+  cfg['cmd'] = cmd
+  cfg['r'] = restrict
+  cfg['engine'] = engine
+  
+  proc = Processor(cfg, governor=config.governor(limits))
+  
+  if libraryPath:
+    proc.useLibrary(library.loadLibrary(libraryPath, restrict))
+  
+  return proc
+
+
+def processText(text, cmd="", restrict=False, lib=None, limits=None):
+  ''' Zpracuje text dokumentu v pameti, volitelne ve stavu po zpracovani knihovny lib (ta neni
+  zpracovanim zmenena) a s limity zdroju limits. Vraci trojici (vystup, navratovy kod,
+  chybova zprava). '''
+  cfg = config.defaults()
+  cfg['cmd'] = cmd
+  cfg['r'] = restrict
+  
+  proc = Processor(cfg, governor=config.governor(limits))
+  
+  if lib is not None:
+    proc.useLibrary(lib)
+  
+  proc.readText(text)
+  
+  return runText(proc)
+
+
+def runText(proc):
+  ''' Zpracuje nacteny vstup procesoru proc do retezce. Vraci trojici (vystup, navratovy kod,
+  chybova zprava). '''
+  try:
+    return proc.process(), 0, ''
+  except Exception as err:
+    code = config.errorCode(err)
+    
+    # neocekavana vyjimka by samostatny beh ukoncila s kodem 1
+    if code is None:
+      return '', 1, "{}: {}".format(type(err).__name__, err)
+    
+    return '', code, str(err)
+
+
+def expand(source, cmd="", restrict=False, libraryPath=None, limits=None, engine='text', steps=1024):
+  ''' Generator useku vystupu pro vstup source (retezec nebo iterovatelny objekt useku textu,
+  ktere jsou cteny az v prubehu zpracovani). Usek vystupu je vracen vzdy po zpracovani steps
+  lexikalnich jednotek, pokud do vystupu neco pribylo. Ostatni volby viz funkce createProcessor. '''
+  proc = createProcessor(cmd, restrict, libraryPath, limits, engine)
+  
+  if isinstance(source, str):
+    proc.readText(source)
+  else:
+    proc.readIterable(source)
+  
+  sink = ListSink()
+  proc.begin(sink=sink)
+  
+  running = True
+  
+  while running:
+    running = proc.run(steps)
+    output = sink.drain()
+    
+    if output:
+      yield output
+
+
+def expandText(source, cache=None, **options):
+  ''' Zpracuje vstup source a vrati cely vystup jako retezec. Volby viz funkce expand.
+  S instanci results.ResultCache je vysledek (i chyba) ulozen do cache a pro stejny vstup
+  a volby vracen bez zpracovani. '''
+  if cache is None:
+    return ''.join(expand(source, **options))
+  
+  options.pop('steps', None)
+  proc = createProcessor(**options)
+  
+  if isinstance(source, str):
+    proc.readText(source)
+  else:
+    proc.readIterable(source)
+  
+  return results.process(proc, cache)
+
+
+async def aexpand(source, cmd="", restrict=False, libraryPath=None, limits=None, engine='text', steps=1024):
+  ''' Asynchronni generator useku vystupu. Vstup source je retezec, iterovatelny objekt nebo
+  asynchronne iterovatelny objekt useku textu. Po kazdych steps lexikalnich jednotkach je vracen
+  pribyly vystup a rizeni je predano smycce udalosti. Ostatni volby viz funkce createProcessor. '''
+  proc = createProcessor(cmd, restrict, libraryPath, limits, engine)
+  
+  chunks = None
+  
+  if isinstance(source, str):
+    proc.readText(source)
+  
+  elif hasattr(source, '__aiter__'):
+    chunks = source.__aiter__()
+    feed = ChunkFeed()
+    proc.readIterable(feed)
+  
+  else:
+    proc.readIterable(source)
+  
+  sink = ListSink()
+  proc.begin(sink=sink, restartable=chunks is not None)
+  
+  running = True
+  
+  while running:
+    # zpracovani, ktere narazi na konec dosud nactenych useku, se vrati na zacatek rozpracovane
+    # jednotky a pokracuje po nacteni dalsich useku; jejich objem je alespon takovy jako objem
+    # useku, ktere budou cteny znovu, jednotka pres mnoho useku je tak ctena nejvyse
+    # logaritmicky mnohokrat a celkova prace zustava linearni
+    try:
+      running = proc.run(steps)
+    except InputUnderflow:
+      size = 0
+      
+      while size <= proc.content.replayed:
+        try:
+          chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+          feed.close()
+          break
+        
+        feed.feed(chunk)
+        size += len(chunk)
+    
+    output = sink.drain()
+    
+    if output:
+      yield output
+    
+    await asyncio.sleep(0)
+
+
+async def expandAsync(source, write, timeout=None, **options):
+  ''' Zpracuje vstup source a useky vystupu predava asynchronni funkci write. Trva-li zpracovani
+  (vcetne cekani na vstup a vystup) dele nez timeout sekund, je zruseno a vyhazuje
+  asyncio.TimeoutError. Volby viz funkce aexpand. '''
+  async def run():
+    async for chunk in aexpand(source, **options):
+      await write(chunk)
+  
+  await asyncio.wait_for(run(), timeout)
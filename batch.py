@@ -0,0 +1,155 @@
+#JMP:xkovar66
+''' Davkove zpracovani mnoha souboru v jednom behu programu. Soubory jsou rozdeleny mezi
+procesy z fondu concurrent.futures, kazdy soubor je zpracovan novou instanci tridy Processor
+(a tedy i novou tabulkou maker), vysledky jsou proto shodne se samostatnymi behy. '''
+
+import glob
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+import library
+import processor
+from processor import Processor
+
+
+def collectInputs(spec):
+  ''' Vrati serazeny seznam vstupnich souboru. Specifikace je bud glob vzor, nebo jmeno souboru
+  se seznamem vstupu (jeden na radek) uvozene znakem '@'. '''
+  if spec.startswith('@'):
+    with open(spec[1:], 'r') as f:
+      return [line.strip() for line in f if line.strip()]
+    
+  return sorted(path for path in glob.glob(spec, recursive=True) if os.path.isfile(path))
+
+
+def outputPaths(inputs, outdir):
+  ''' Vrati cesty vystupnich souboru. Zachovava adresarovou strukturu vstupu vzhledem k jejich
+  spolecnemu adresari, aby nedoslo ke kolizi souboru stejneho jmena. '''
+  if not inputs:
+    return []
+  
+  paths = [os.path.abspath(path) for path in inputs]
+  root = os.path.commonpath([os.path.dirname(path) for path in paths])
+  
+  return [os.path.join(outdir, os.path.relpath(path, root)) for path in paths]
+
+
+# knihovny nactene v tomto procesu: (cesta, priznak -r) -> knihovna
+libraries = {}
+
+
+def getLibrary(path, restrict):
+  ''' Vrati knihovnu maker, soubory zpracovane stejnym procesem ji sdileji (kazdy pracuje
+  s vlastni vetvi jeji tabulky) '''
+  lib = libraries.get( (path, restrict) )
+  
+  if lib is None:
+    lib = libraries[path, restrict] = library.loadLibrary(path, restrict)
+  
+  return lib
+
+
+def processFile(job):
+  ''' Zpracuje jeden soubor davky stejne jako samostatny beh programu. Prijima n-tici
+  (vstup, vystup, cmd, r, knihovna, limity, analyzator, inline), vraci n-tici (vstup, vystup, navratovy kod,
+  zprava). '''
+  inputPath, outputPath, cmd, restrict, libraryPath, limits, engine, inline = job
+  
+  cfg = config.defaults()
+  cfg['input'] = inputPath
+  cfg['output'] = outputPath
+  cfg['cmd'] = cmd
+  cfg['r'] = restrict
+  cfg['engine'] = engine
+  cfg['inline'] = inline
+  
+  proc = Processor(cfg, governor=config.governor(limits))
+  
+  # knihovna je nactena jednou v kazdem procesu davky
+  if libraryPath:
+    try:
+      proc.useLibrary(getLibrary(libraryPath, restrict))
+    except Exception as err:
+      return inputPath, outputPath, config.errorCode(err) or config.READ_FILE_ERR, "{}: {}".format(libraryPath, err)
+  
+  try:
+    proc.readfile()
+  except Exception as err:
+    return inputPath, outputPath, config.READ_FILE_ERR, str(err)
+  
+  try:
+    os.makedirs(os.path.dirname(outputPath) or '.', exist_ok=True)
+    fh = open(outputPath, 'w')
+  except Exception as err:
+    return inputPath, outputPath, config.WRITE_FILE_ERR, str(err)
+  
+  try:
+    proc.process(sink=processor.FileSink(fh))
+  except Exception as err:
+    code = config.errorCode(err)
+    
+    # po chybe zapisu zustavaji v bufferu souboru nezapsana data, zavreni selze znovu
+    try:
+      fh.close()
+    except OSError:
+      pass
+    
+    # neocekavana vyjimka by samostatny beh ukoncila s kodem 1
+    if code is None:
+      return inputPath, outputPath, 1, "{}: {}".format(type(err).__name__, err)
+    
+    return inputPath, outputPath, code, str(err)
+  
+  try:
+    fh.close()
+  except OSError as err:
+    return inputPath, outputPath, config.WRITE_FILE_ERR, str(err)
+  
+  return inputPath, outputPath, 0, ''
+
+
+def runBatch(inputs, outdir, cmd="", restrict=False, jobs=None, libraryPath=False, limits=None,
+             engine='text', inline=False):
+  ''' Zpracuje vsechny vstupni soubory, vystupy ulozi do adresare outdir. Pocet procesu urcuje
+  jobs (implicitne pocet procesoru), limity zdroju plati pro kazdy soubor zvlast. Vraci seznam
+  vysledku ve stejnem poradi jako vstupy. '''
+  jobList = [(path, out, cmd, restrict, libraryPath, limits, engine, inline) for path, out in zip(inputs, outputPaths(inputs, outdir))]
+  
+  if jobs is None:
+    jobs = os.cpu_count() or 1
+  
+  if jobs == 1 or len(jobList) <= 1:
+    return [processFile(job) for job in jobList]
+  
+  with ProcessPoolExecutor(max_workers=jobs) as pool:
+    return list(pool.map(processFile, jobList, chunksize=max(1, len(jobList) // (jobs * 4))))
+
+
+def summary(results):
+  ''' Souhrnna zprava o davce, jeden radek na soubor: navratovy kod, vstup, vystup, chyba '''
+  s = ""
+  failed = 0
+  
+  for inputPath, outputPath, code, message in results:
+    s += "{:3} {} -> {}".format(code, inputPath, outputPath)
+    
+    if code:
+      failed += 1
+      s += ": " + message.replace('\n', ' ')
+      
+    s += '\n'
+    
+  s += "{} files, {} failed\n".format(len(results), failed)
+  
+  return s
+
+
+def exitCode(results):
+  ''' Navratovy kod davky: 0 pri uspechu vsech souboru, jinak kod prvniho neuspesneho souboru '''
+  for result in results:
+    if result[2]:
+      return result[2]
+    
+  return 0
@@ -0,0 +1,9 @@
+#JMP:xkovar66
+''' Vykonnostni testy makroprocesoru JMP. Generuje synteticke vstupy znamych velikosti,
+zpracovava je makroprocesorem a meri propustnost a empiricky exponent skalovani.
+
+Spusteni: python3 -m bench --help
+'''
+
+from bench.workloads import WORKLOADS
+from bench.runner import runWorkload, runAll, scalingExponent
@@ -0,0 +1,91 @@
+#JMP:xkovar66
+''' Spusteni vykonnostnich testu: python3 -m bench [volby] [zatez ...] '''
+
+import json
+import sys
+
+from bench.runner import runAll
+from bench.workloads import WORKLOADS
+
+
+def help():
+  s  = "Vykonnostni testy makroprocesoru JMP - ovladani:\n"
+  s += "  --help              Vytiskne napovedu\n"
+  s += "  --scales=1,2,4,8    Nasobky zakladni velikosti vstupu\n"
+  s += "  --repeat=N          Pocet opakovani mereni (bere se nejlepsi cas)\n"
+  s += "  --output=filename   Vysledky ve formatu JSON zapise do souboru (implicitne stdout)\n"
+  s += "  --max-exponent=E    Skonci s chybou 1, pokud exponent skalovani nektere zateze prekroci E\n"
+  s += "  --engine=E          Lexikalni analyzator makroprocesoru: text nebo regex (viz jmp.py --help)\n"
+  s += "  --inline            Vkladani volani maker do tel maker (viz jmp.py --help)\n"
+  s += "  zatez ...           Omezi mereni na vybrane zateze: {}\n".format(', '.join(sorted(WORKLOADS)))
+  
+  return s
+
+
+def main(argv):
+  scales = (1, 2, 4, 8)
+  repeat = 3
+  output = None
+  maxExponent = None
+  engine = 'text'
+  inline = False
+  names = []
+  
+  for arg in argv[1:]:
+    
+    if arg == '--help':
+      print(help(), end="")
+      return 0
+    
+    elif arg.startswith('--scales='):
+      scales = tuple(int(i) for i in arg[9:].split(','))
+      
+    elif arg.startswith('--repeat='):
+      repeat = int(arg[9:])
+      
+    elif arg.startswith('--output='):
+      output = arg[9:]
+      
+    elif arg.startswith('--max-exponent='):
+      maxExponent = float(arg[15:])
+      
+    elif arg.startswith('--engine='):
+      engine = arg[9:]
+      
+    elif arg == '--inline':
+      inline = True
+      
+    elif arg in WORKLOADS:
+      names.append(arg)
+      
+    else:
+      print("Neznamy parametr: {}".format(arg), file=sys.stderr)
+      return 1
+    
+  results = runAll(names, scales, repeat, engine, inline)
+  
+  text = json.dumps(results, indent=2)
+  
+  if output:
+    with open(output, 'w') as fh:
+      fh.write(text + '\n')
+  else:
+    print(text)
+  
+  # souhrn na chybovy vystup, aby neprekazel strojovemu zpracovani
+  failed = False
+  
+  for res in results['workloads']:
+    last = res['runs'][-1]
+    print("{:14} {:>12.0f} B/s {:>10.0f} exp/s  exponent {:.2f}".format(
+          res['workload'], last['bytes_per_s'] or 0, last['expansions_per_s'] or 0, res['exponent'] or 0),
+          file=sys.stderr)
+    
+    if maxExponent is not None and res['exponent'] is not None and res['exponent'] > maxExponent:
+      failed = True
+      
+  return 1 if failed else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv))
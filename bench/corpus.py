@@ -0,0 +1,107 @@
+#JMP:xkovar66
+''' Spolecny korpus vstupu pro porovnavani ruznych implementaci makroprocesoru. Obsahuje rucne
+psane pripady pokryvajici jednotlive konstrukce jazyka (vcetne chybovych vstupu) a nahodne
+generovane dokumenty. '''
+
+import random
+
+
+# jmeno -> vstup
+CASES = {
+  'basic'       : "@def@foo{$x}{a $x b}@foo{Q}@let@bar@foo @bar{Z} @@ @{ x\n",
+  'nested'      : "@def@A{}{<@B>}@def@B{}{[@C]}@def@C{$x $y}{($y,$x)}@A{1}{2} tail\n",
+  'spaces'      : "a b  c\n@set{-INPUT_SPACES}a b   c\n @def @x {$a} { $a - $a } @x {1 2}\n"
+                  "@set{+INPUT_SPACES}d e\n",
+  'redef'       : "@def@m{}{one}@m @def@m{}{two}@m\n",
+  'let'         : "@def@m{$a}{<$a>}@let@n@m@n{x}@let@m@null@n{y}\n",
+  'null'        : "@null text @let@null@def ok\n",
+  'block_esc'   : "@def@e{}{@{@} @@@@ x}@e {a{b}c@{}\n",
+  'concat'      : "@def@mk{$n}{@def@$n{}{made}}@mk{q} @q\n",
+  'arg_split'   : "@def@f{$a $b $c}{[$a|$b|$c]}@f xyz @f{1}2 3\n",
+  'name_join'   : "@def@ab{}{AB}@def@j{$x}{@a$x}@j{b} @j{b c}\n",
+  'block_join'  : "@def@w{$x}{[{$x}]}@w{a} @w{b {c} d}\n",
+  'param_head'  : "@def@c{$x $y}{{$x}x}@c{a}{b} @def@d{$x}{{$x}{z}y  }@d{q}\n",
+  'large_block' : "@def@m{}{<" + "x" * 20000 + ">}@m @m\n",
+  'macro_end'   : "@def@q{}{Q}abc@q",
+  'deep'        : "@def@r0{}{x}" + ''.join("@def@r{0}{{}}{{@r{1}@r{1}}}".format(i, i - 1) for i in range(1, 10))
+                  + "@r9\n",
+  'unicode'     : "@def@ž{$y}{«$y»}@ž{čáp} @ž{ }\x1c\n",
+  'err_unclosed': "abc {def\n",
+  'err_dollar'  : "abc $x\n",
+  'err_undef'   : "x @undefined y\n",
+  'err_redef'   : "@def@__def__{}{}\n",
+  'err_at_end'  : "abc @",
+  'err_escape'  : "abc @+ def\n",
+  'err_set'     : "@set{foo}\n",
+  'err_defargs' : "@def@x{a}{b}\n",
+  'err_toofew'  : "@def@x{$a $b}{$a$b}@x{1}",
+}
+
+
+def generate(rnd, depth=0):
+  ''' Vygeneruje nahodny usek dokumentu s makry @x, @y, @z a @w '''
+  out = []
+  
+  for i in range(rnd.randint(1, 8)):
+    r = rnd.random()
+    
+    if r < 0.3:
+      out.append(rnd.choice(['a', 'bc', ' ', '\n', '  x ', '@@', '@{', '@}', '\t']))
+    
+    elif r < 0.45 and depth < 3:
+      out.append('{' + generate(rnd, depth + 1) + '}')
+    
+    elif r < 0.6:
+      out.append(rnd.choice(['@x', '@y', '@z', '@w', '@null']) + rnd.choice(['', ' ', '{k}', 'q']))
+    
+    elif r < 0.7:
+      out.append('@set{{{}INPUT_SPACES}}'.format(rnd.choice('+-')))
+    
+    elif r < 0.8 and depth < 2:
+      out.append('@def@{}{{{}}}{{{}}}'.format(rnd.choice('zw'), rnd.choice(['', '$a', '$a $b']),
+                                            generate(rnd, depth + 1).replace('k', '$a')))
+    
+    elif r < 0.85:
+      out.append('@let@{}@{}'.format(rnd.choice('zw'), rnd.choice(['x', 'y', 'null', 'z'])))
+    
+    else:
+      out.append(rnd.choice(['@x{1}', '@y{1}{2}', '@y 12', '@x@y']))
+  
+  return ''.join(out)
+
+
+PRELUDE = "@def@x{$a}{<$a>}@def@y{$a $b}{$b$a}@def@z{}{Z}@def@w{$a}{@z$a}"
+
+
+def randomCases(count, seed=0):
+  ''' Vrati slovnik count nahodnych dokumentu, pro stejne seed vzdy stejny '''
+  rnd = random.Random(seed)
+  
+  return {'random{:04d}'.format(i): PRELUDE + generate(rnd) + '\n' for i in range(count)}
+
+
+# useky nahodnych vstupu bez struktury, vcetne chybnych a nedokoncenych konstrukci
+FRAGMENTS = ['a', 'bc', ' ', '  ', '\t \n', '\n', '{', '{', '}', '{b}', '@{', '@}', '@@', '@$', '$', '@',
+             '@+', '@x', '@m', '@m1', '{@m}', '@null', '@set{-INPUT_SPACES}', '@set{+INPUT_SPACES}', 'ž']
+
+
+def noiseCases(count, seed=0):
+  ''' Vrati slovnik count nahodnych posloupnosti useku FRAGMENTS (s definici makra @m) '''
+  rnd = random.Random(seed)
+  cases = {}
+  
+  for i in range(count):
+    fragments = [rnd.choice(FRAGMENTS) for j in range(rnd.randint(1, 40))]
+    cases['noise{:04d}'.format(i)] = '@def@m{$a}{[$a]}' + ''.join(fragments)
+  
+  return cases
+
+
+def corpus(count=200, seed=0, noise=0):
+  ''' Vrati cely korpus: rucne psane pripady, count nahodnych dokumentu a noise nahodnych
+  posloupnosti useku '''
+  cases = dict(CASES)
+  cases.update(randomCases(count, seed))
+  cases.update(noiseCases(noise, seed))
+  
+  return cases
@@ -0,0 +1,212 @@
+#JMP:xkovar66
+''' Porovnani lexikalnich analyzatoru makroprocesoru nad spolecnym korpusem. Kazdy dokument je
+zpracovan vsemi analyzatory (s -r i bez nej, vcelku i po kratkych usecich vstupu), vystup
+a trida pripadne chyby musi byt shodne. Dale musi byt shodne posloupnosti lexikalnich jednotek
+dokumentu (bez expanze maker) v obou rezimech bilych znaku, po jednotlivych znacich i po celych
+usecich textu - sousedni useky obycejneho textu jsou pred porovnanim spojeny, analyzatory je
+mohou delit ruzne. Vystup asynchronniho zpracovani (api.aexpand) vstupu po kratkych usecich musi
+byt shodny s vystupem synchronniho zpracovani tymz analyzatorem.
+
+Spusteni: python3 -m bench.differential [volby] '''
+
+import asyncio
+import sys
+
+import api
+import config
+from processor import Processor, Governor, ListSink, Scanner
+
+from bench.corpus import corpus
+
+
+ENGINES = ('text', 'regex')
+
+# nahodne dokumenty mohou obsahovat nekonecnou rekurzi maker
+MAX_EXPANSIONS = 20000
+
+# delka useku vstupu pri cteni po usecich, jednotky pak casto lezi na hranici ramcu
+CHUNK = 3
+
+
+def createProcessor(text, engine, restrict=False, chunk=None):
+  ''' Vrati procesor s analyzatorem engine, ktery cte text vcelku nebo po usecich delky chunk '''
+  cfg = config.defaults()
+  cfg['engine'] = engine
+  cfg['r'] = restrict
+
+  proc = Processor(cfg, governor=Governor(expansions=MAX_EXPANSIONS))
+
+  if chunk is None:
+    proc.readText(text)
+  else:
+    proc.readIterable(text[i:i + chunk] for i in range(0, len(text), chunk))
+
+  return proc
+
+
+def run(text, engine, restrict=False, chunk=None):
+  ''' Zpracuje dokument analyzatorem engine. Vraci dvojici (vystup, nazev tridy vyjimky),
+  pri chybe je vystup None. '''
+  proc = createProcessor(text, engine, restrict, chunk)
+
+  try:
+    return proc.process(), None
+  except Exception as err:
+    return None, type(err).__name__
+
+
+def runAsync(text, engine, chunk):
+  ''' Zpracuje dokument analyzatorem engine asynchronne, vstup je predavan po usecich delky chunk
+  asynchronnim iteratorem. Vraci stejnou dvojici jako funkce run. '''
+  async def chunks():
+    for i in range(0, len(text), chunk):
+      await asyncio.sleep(0)
+      yield text[i:i + chunk]
+
+  async def collect():
+    output = []
+
+    async for part in api.aexpand(chunks(), engine=engine, limits=(MAX_EXPANSIONS, None, None, None)):
+      output.append(part)
+
+    return ''.join(output)
+
+  try:
+    return asyncio.run(collect()), None
+  except Exception as err:
+    return None, type(err).__name__
+
+
+def lexTokens(text, engine, bulk=False, ignore=False, chunk=None):
+  ''' Rozlozi dokument analyzatorem engine na lexikalni jednotky (bez expanze maker). Vraci
+  dvojici (n-tice jednotek, nazev tridy vyjimky nebo None). '''
+  proc = createProcessor(text, engine, chunk=chunk)
+  proc.begin(sink=ListSink())
+
+  scanner = proc.scanner
+
+  if ignore:
+    scanner.ignoreWhitespace()
+
+  tokens = []
+  error = None
+
+  try:
+    while True:
+      token = scanner.getToken(bulk)
+
+      if token is None:
+        break
+
+      if token[0] == Scanner.s_text and tokens and tokens[-1][0] == Scanner.s_text:
+        token = Scanner.s_text, tokens.pop()[1] + token[1]
+
+      tokens.append(token)
+
+  except Exception as err:
+    error = type(err).__name__
+
+  return tuple(tokens), error
+
+
+def checks(text, engine):
+  ''' Vrati slovnik vsech porovnavanych vysledku dokumentu pro analyzator engine '''
+  results = {}
+
+  for chunk in (None, CHUNK):
+    suffix = "" if chunk is None else " chunk={}".format(chunk)
+
+    for restrict in (False, True):
+      results["output" + (" -r" if restrict else "") + suffix] = run(text, engine, restrict, chunk)
+
+    for bulk in (False, True):
+      for ignore in (False, True):
+        name = "tokens" + (" bulk" if bulk else "") + (" -INPUT_SPACES" if ignore else "") + suffix
+        results[name] = lexTokens(text, engine, bulk, ignore, chunk)
+
+  return results
+
+
+def compare(cases, engines=ENGINES):
+  ''' Porovna vysledky analyzatoru pro vsechny dokumenty. Vraci seznam rozdilu ve tvaru
+  (jmeno dokumentu, porovnani, {analyzator nebo rezim: vysledek}) a pocet porovnani. '''
+  differences = []
+  count = 0
+
+  for name in sorted(cases):
+    results = {engine: checks(cases[name], engine) for engine in engines}
+
+    for check in results[engines[0]]:
+      count += 1
+      values = {engine: results[engine][check] for engine in engines}
+
+      if len(set(values.values())) > 1:
+        differences.append( (name, check, values) )
+
+    for engine in engines:
+      count += 1
+      values = {'sync': results[engine]["output chunk={}".format(CHUNK)],
+                'async': runAsync(cases[name], engine, CHUNK)}
+
+      if values['sync'] != values['async']:
+        differences.append( (name, "output async {}".format(engine), values) )
+
+  return differences, count
+
+
+def help():
+  s  = "Porovnani lexikalnich analyzatoru makroprocesoru JMP - ovladani:\n"
+  s += "  --help              Vytiskne napovedu\n"
+  s += "  --random=N          Pocet nahodnych dokumentu korpusu (implicitne 200)\n"
+  s += "  --noise=N           Pocet nahodnych posloupnosti useku jazyka (implicitne 200)\n"
+  s += "  --seed=S            Seminko generatoru nahodnych dokumentu\n"
+  s += "  --engines=a,b       Porovnavane analyzatory (implicitne {})\n".format(','.join(ENGINES))
+
+  return s
+
+
+def main(argv):
+  count = 200
+  noise = 200
+  seed = 0
+  engines = ENGINES
+
+  for arg in argv[1:]:
+
+    if arg == '--help':
+      print(help(), end="")
+      return 0
+
+    elif arg.startswith('--random='):
+      count = int(arg[9:])
+
+    elif arg.startswith('--noise='):
+      noise = int(arg[8:])
+
+    elif arg.startswith('--seed='):
+      seed = int(arg[7:])
+
+    elif arg.startswith('--engines='):
+      engines = tuple(arg[10:].split(','))
+
+    else:
+      print("Neznamy parametr: {}".format(arg), file=sys.stderr)
+      return 1
+
+  cases = corpus(count, seed, noise)
+  differences, checked = compare(cases, engines)
+
+  for name, check, results in differences:
+    print("{} [{}]:".format(name, check))
+
+    for key, value in results.items():
+      print("  {:8} {!r}".format(key, value))
+
+  print("{} documents, {} comparisons, {} differences".format(len(cases), checked, len(differences)),
+        file=sys.stderr)
+
+  return 1 if differences else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv))
@@ -0,0 +1,89 @@
+#JMP:xkovar66
+''' Mereni vykonu makroprocesoru nad generovanymi vstupy. '''
+
+import math
+import time
+
+import config
+from processor import Processor
+
+from bench.workloads import WORKLOADS
+
+
+def measure(text, repeat=3, engine='text', inline=False):
+  ''' Zpracuje text novou instanci makroprocesoru s lexikalnim analyzatorem engine (a pripadne
+  s vkladanim volani maker) a vrati nejkratsi dobu behu v sekundach '''
+  best = None
+  
+  cfg = config.defaults()
+  cfg['engine'] = engine
+  cfg['inline'] = inline
+  
+  for i in range(repeat):
+    proc = Processor(cfg)
+    
+    start = time.perf_counter()
+    proc.process(text)
+    elapsed = time.perf_counter() - start
+    
+    if best is None or elapsed < best:
+      best = elapsed
+      
+  return best
+
+
+def scalingExponent(points):
+  ''' Vrati sklon primky prolozene body (velikost, cas) v logaritmickem meritku metodou nejmensich
+  ctvercu. Linearni algoritmus ma exponent blizky 1, kvadraticky 2. '''
+  xs = [math.log(size) for size, seconds in points]
+  ys = [math.log(max(seconds, 1e-9)) for size, seconds in points]
+  
+  if len(xs) < 2:
+    return None
+  
+  mx = sum(xs) / len(xs)
+  my = sum(ys) / len(ys)
+  
+  den = sum((x - mx) ** 2 for x in xs)
+  
+  if not den:
+    return None
+  
+  return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / den
+
+
+def runWorkload(name, scales=(1, 2, 4, 8), repeat=3, engine='text', inline=False):
+  ''' Zmeri jeden druh zateze pri nekolika velikostech. Vraci slovnik s namerenymi hodnotami. '''
+  generator, base = WORKLOADS[name]
+  runs = []
+  
+  for scale in scales:
+    text, expansions = generator(base * scale)
+    seconds = measure(text, repeat, engine, inline)
+    
+    runs.append({
+      'n'              : base * scale,
+      'bytes'          : len(text),
+      'expansions'     : expansions,
+      'seconds'        : seconds,
+      'bytes_per_s'    : len(text) / seconds if seconds else None,
+      'expansions_per_s': expansions / seconds if seconds else None,
+    })
+    
+  exponent = scalingExponent([(run['bytes'], run['seconds']) for run in runs])
+  
+  return {'workload': name, 'runs': runs, 'exponent': exponent}
+
+
+def runAll(names=None, scales=(1, 2, 4, 8), repeat=3, engine='text', inline=False):
+  ''' Zmeri vsechny (pripadne vybrane) druhy zateze '''
+  if not names:
+    names = sorted(WORKLOADS)
+    
+  return {
+    'scales'   : list(scales),
+    'repeat'   : repeat,
+    'engine'   : engine,
+    'inline'   : inline,
+    'workloads': [runWorkload(name, scales, repeat, engine, inline) for name in names],
+  }
@@ -0,0 +1,99 @@
+#JMP:xkovar66
+''' Generatory syntetickych vstupu. Kazdy generator prijima velikost n a vraci dvojici
+(vstup, pocet expanzi), pocet expanzi je dan konstrukci vstupu. Velikost vstupu i pocet
+expanzi rostou s n linearne. '''
+
+
+def literal(n):
+  ''' Dlouhy obycejny text bez jedineho makra '''
+  line = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod.\n"
+  return line * n, 0
+
+
+def smallDefs(n):
+  ''' Mnoho malych definic, kazda je jednou pouzita '''
+  parts = []
+  
+  for i in range(n):
+    parts.append("@def@m{0}{{$a}}{{<$a>}}@m{0}{{item {0}}}\n".format(i))
+    
+  return ''.join(parts), 2 * n
+
+
+def recursive(n):
+  ''' Retez n vzajemne se volajicich maker, jejichz expanze je opet zpracovana '''
+  parts = ["@def@c0{}{.}"]
+  
+  for i in range(1, n + 1):
+    parts.append("@def@c{0}{{}}{{@c{1}+}}".format(i, i - 1))
+    
+  parts.append("@c{}\n".format(n))
+  
+  return ''.join(parts), 2 * (n + 1)
+
+
+def wideArgs(n, argc=16):
+  ''' Makro se sirokym seznamem argumentu volane n krat '''
+  names = ["$a{}".format(i) for i in range(argc)]
+  parts = ["@def@wide{{{0}}}{{{1}}}\n".format(' '.join(names), '-'.join(names))]
+  call = "@wide" + ''.join("{{v{}}}".format(i) for i in range(argc)) + "\n"
+  
+  parts.append(call * n)
+  
+  return ''.join(parts), n + 1
+
+
+def letAliases(n):
+  ''' Intenzivni vytvareni synonym pomoci @let a volani pres ne '''
+  parts = ["@def@base{$x}{[$x]}@let@a0@base\n"]
+  
+  for i in range(1, n + 1):
+    parts.append("@let@a{0}@a{1}@a{0}{{{0}}}\n".format(i, i - 1))
+    
+  return ''.join(parts), 2 * n + 2
+
+
+def inputSpaces(n):
+  ''' Odsazeny text v rezimu ignorovani bilych znaku s volanim maker '''
+  parts = ["@set{-INPUT_SPACES}@def@t{$v}{ value = $v ; }\n"]
+  
+  for i in range(n):
+    parts.append("    indented   text   {0}\n        @t{{ {0} }}\n".format(i))
+    
+  parts.append("@set{+INPUT_SPACES}\n")
+  
+  return ''.join(parts), n + 3
+
+
+def nestedCalls(n):
+  ''' Opakovane volani makra, jehoz telo vola dalsi makra s bloky - expanze je pokazde znovu ctena '''
+  parts = ["@def@cell{$v}{<td>$v</td>}@def@row{$a $b}{<tr>@cell{$a}@cell{$b}@cell{{x}}</tr>}\n"]
+  
+  for i in range(n):
+    parts.append("@row{{{0}}}{{{0}}}\n".format(i))
+    
+  return ''.join(parts), 4 * n + 2
+
+
+def largeBlocks(n, size=4096):
+  ''' Definice maker s tely o velikosti nekolika kilobajtu, kazde makro je jednou pouzito '''
+  body = "<p>@b{$t} lorem ipsum dolor sit amet @@@@ {nested {block}}</p>\n" * (size // 64)
+  parts = ["@def@b{$x}{<b>$x</b>}\n"]
+  
+  for i in range(n):
+    parts.append("@def@m{0}{{$t}}{{{1}}}@m{0}{{{0}}}\n".format(i, body))
+    
+  return ''.join(parts), n * (2 + body.count('@b{')) + 1
+
+
+# jmeno -> (generator, zakladni velikost)
+WORKLOADS = {
+  'literal'     : (literal, 4000),
+  'small_defs'  : (smallDefs, 1000),
+  'recursive'   : (recursive, 1000),
+  'wide_args'   : (wideArgs, 500),
+  'let_aliases' : (letAliases, 1000),
+  'input_spaces': (inputSpaces, 1000),
+  'nested_calls': (nestedCalls, 1000),
+  'large_blocks': (largeBlocks, 100),
+}
@@ -0,0 +1,118 @@
+#JMP:xkovar66
+''' Konfigurace behu makroprocesoru sdilena prikazovou radkou (jmp.py) a ostatnimi moduly:
+navratove kody, implicitni hodnoty voleb, prevod vyjimek zpracovani na navratove kody a limity
+zdroju. Modul nezavisi na zpracovani argumentu prikazove radky. '''
+
+# processor pred macro, ktere jej importuje zpetne (viz jmp.py)
+import processor
+import macro
+
+
+SYNTAX_ERR = 55
+SEMANTIC_ERR = 56
+REDEF_ERR = 57
+INVALID_ARG_ERR = 1
+READ_FILE_ERR = 2
+WRITE_FILE_ERR = 3
+LIMIT_ERR = 58
+
+# implicitni hodnoty voleb (viz jmp.py --help)
+DEFAULTS = {
+    'help'   : False,
+    'input'  : False,
+    'output' : False,
+    'cmd'    : "",
+    'r'      : False,
+    'ascii'  : False,
+    'engine' : 'text',
+    'inline' : False,
+    'stats'  : False,
+    'max-expansions': None,
+    'max-input'     : None,
+    'max-output'    : None,
+    'timeout'       : None,
+    'library': False,
+    'cache-dir'  : False,
+    'cache-size' : 256,
+    'serve'  : False,
+    'batch'  : False,
+    'outdir' : False,
+    'jobs'   : None,
+    'stream' : False
+           }
+
+
+class ConfigSet:
+  ''' Ridici struktura, obsahuje konfiguraci aktualniho behu programu. '''
+  
+  def __init__(self, options):
+    self.options = options
+  
+  def __getitem__(self, key):
+    return self.options[key]
+  
+  def __setitem__(self, key, val):
+    self.options[key] = val
+  
+  def isHelp(self):
+    return self.options['help']
+  
+  def __str__(self):
+    ret = ""
+    
+    for i in self.options.items():
+      ret += str(i[0]) + " : " + str(i[1])
+      ret += '\n';
+    
+    return ret
+
+
+def defaults():
+  ''' Vrati novou instanci ConfigSet s implicitnimi hodnotami vsech voleb '''
+  return ConfigSet(dict(DEFAULTS))
+
+
+def errorCode(err):
+  ''' Vrati navratovy kod odpovidajici vyjimce vznikle pri zpracovani vstupu, pripadne None,
+  pokud jde o neocekavanou vyjimku. '''
+  if isinstance(err, (processor.BlockNotClosedError, processor.IllegalCharSequenceError, SyntaxError)):
+    return SYNTAX_ERR
+  
+  # kazda vyjimka nese informaci o chybe
+  if isinstance(err, (macro.UnknownMacroError, processor.ArgumentsError, macro.MacroNotDefinedError)):
+    return SEMANTIC_ERR
+  
+  if isinstance(err, macro.IllegalMacroRedefinition):
+    return REDEF_ERR
+  
+  # vystup je zapisovan prubezne, chyba zapisu se projevi behem zpracovani
+  if isinstance(err, processor.OutputError):
+    return WRITE_FILE_ERR
+  
+  # vstup je cten prubezne, chyba cteni se tedy muze projevit az behem zpracovani
+  if isinstance(err, (OSError, UnicodeError)):
+    return READ_FILE_ERR
+  
+  if isinstance(err, processor.ResourceLimitError):
+    return LIMIT_ERR
+  
+  return None
+
+
+def limits(cfg):
+  ''' Vrati n-tici limitu zdroju z konfigurace (argumenty processor.Governor), None pokud
+  zadny limit neni zadan '''
+  values = (cfg['max-expansions'], cfg['max-input'], cfg['max-output'], cfg['timeout'])
+  
+  if all(value is None for value in values):
+    return None
+  
+  return values
+
+
+def governor(limits):
+  ''' Vrati instanci processor.Governor pro n-tici limitu, None bez limitu '''
+  if limits is None:
+    return None
+  
+  return processor.Governor(*limits)
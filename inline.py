@@ -0,0 +1,194 @@
+#JMP:xkovar66
+''' Vkladani (inlining) vnorenych volani uzivatelskych maker do tel maker (jmp.py --inline).
+
+Expanze je vlozena zpet na vstup a ctena znovu, vyznam expanze je tedy stejny jako nahrazeni
+volani makra jeho expanzi primo v textu. Zacina-li telo makra volanim jineho uzivatelskeho makra,
+jehoz argumenty jsou cele v tele, lze toto volani nahradit jeho expanzi predem a pokracovat
+stejne s vysledkem, dokud text pred dalsim volanim obsahuje pouze obycejny text, escape sekvence
+a bloky. Takovy text pri cteni nemeni tabulku maker ani rezim analyzatoru, pouzita makra jsou
+tedy ta, ktera jsou v tabulce v okamziku expanze vnejsiho makra. Nahrazeni je tak platne,
+dokud jsou vsechna pouzita jmena v tabulce svazana se stejnymi makry - to je overeno pred kazdou
+expanzi (straz), jinak je telo vlozeno znovu podle aktualni tabulky.
+
+Vkladan je jen text tela pred prvnim parametrem, dosazena hodnota argumentu muze zmenit
+rozlozeni textu za sebou. Jmeno makra na konci tohoto textu muze pokracovat v textu, ktery
+nasleduje, a neni tedy nahrazeno. Argumenty volani jsou cteny bez ohledu na rezim bilych znaku,
+musi proto nasledovat bezprostredne za jmenem makra. '''
+
+import re
+import weakref
+
+from macro import UserMacro, NullMacro
+
+
+# jednotky v klidovem stavu analyzatoru: obycejny text, escape sekvence, nazev makra, jednoduchy
+# blok (bez vnorenych bloku a escape sekvenci), zacatek ostatnich bloku; \w odpovida presne znakum,
+# pro ktere plati str.isalnum(), a podtrzitku
+re_token = re.compile(r'([^@{}$]+)|@([{}@$])|@(\w+)|\{([^{}@]*)\}|(\{)')
+
+# casti obsahu bloku: text bez ridicich znaku, escape sekvence, zavorky
+re_block = re.compile(r'([^{}@]+)|@(.?)|([{}])', re.S)
+
+
+def lexBlock(text, pos):
+  ''' Precte blok zacinajici za oteviraci zavorkou na pozici pos stejne jako stav s_block_read
+  analyzatoru. Vraci dvojici (obsah bloku, pozice za blokem), None pro neuzavreny blok. '''
+  buff = []
+  depth = 1
+  
+  while True:
+    match = re_block.match(text, pos)
+    
+    if match is None:
+      return None
+    
+    pos = match.end()
+    plain, escaped, brace = match.groups()
+    
+    if plain is not None:
+      buff.append(plain)
+    
+    elif brace is not None:
+      depth += 1 if brace == '{' else -1
+      
+      if not depth:
+        return ''.join(buff), pos
+      
+      buff.append(brace)
+    
+    elif not escaped: # escape na konci textu
+      return None
+    
+    elif escaped in '{}@':
+      buff.append(escaped)
+    
+    else:
+      buff.append('@' + escaped)
+
+
+class Inliner:
+  ''' Tela maker s vlozenymi volanimi a jejich straze '''
+  
+  maxSteps = 256 # nejvyse nahrazenych volani v jednom tele
+  maxLength = 65536 # nejvetsi delka vlozeneho textu
+  maxFailures = 8 # po tolika neplatnych strazich jednoho makra je vkladani vypnuto
+  
+  def __init__(self):
+    self.__macros = weakref.WeakKeyDictionary() # makro -> [makro s vlozenymi volanimi, straz, selhani]
+  
+  def resolve(self, macro, table):
+    ''' Vrati makro, ktere ma byt expandovano misto uzivatelskeho makra macro pri stavu tabulky
+    maker table. Vysledek expanze je vzdy shodny s expanzi makra macro. '''
+    entry = self.__macros.get(macro)
+    
+    if entry is not None:
+      inlined, guard, failures = entry
+      
+      if self.holds(guard, table):
+        return inlined
+      
+      if failures >= self.maxFailures:
+        entry[:2] = macro, () # makra se meni prilis casto, dale se pouziva puvodni telo
+        return macro
+    
+    inlined, guard = self.inline(macro, table)
+    self.__macros[macro] = [inlined, guard, 0 if entry is None else entry[2] + 1]
+    
+    return inlined
+  
+  def holds(self, guard, table):
+    ''' Zda je vsem jmenum straze (dvojice jmeno, makro nebo None) v tabulce prirazeno
+    stejne makro '''
+    for name, target in guard:
+      current = table[name] if table.exists(name) else None
+      
+      if current is not target:
+        return False
+    
+    return True
+  
+  def inline(self, macro, table):
+    ''' Vrati dvojici (makro s vlozenymi volanimi, straz) '''
+    parts = macro.template[0]
+    guard = {}
+    
+    head = self.inlineText(parts[0], table, guard)
+    
+    if head == parts[0]:
+      return macro, tuple(guard.items())
+    
+    return macro.withHead(head), tuple(guard.items())
+  
+  def inlineText(self, text, table, guard):
+    ''' Nahrazuje volani maker na zacatku textu jejich expanzi, do straze guard zapisuje
+    pouzita jmena. Vraci vysledny text. '''
+    done = [] # zacatek textu, ve kterem uz neni zadne volani
+    length = 0
+    pos = 0
+    steps = 0
+    
+    while steps < self.maxSteps:
+      match = re_token.match(text, pos)
+      
+      if match is None: # chyba nebo konec textu, zbytek je ponechan
+        break
+      
+      plain, escaped, name, simple, block = match.groups()
+      end = match.end()
+      
+      if block is not None:
+        result = lexBlock(text, end)
+        
+        if result is None:
+          break
+        
+        end = result[1]
+      
+      if name is None:
+        done.append(text[pos:end])
+        length += end - pos
+        pos = end
+        continue
+      
+      # jmeno na konci textu muze pokracovat v nasledujicim textu
+      if end == len(text):
+        break
+      
+      name = '@' + name
+      target = table[name] if table.exists(name) else None
+      guard[name] = target
+      
+      if type(target) is NullMacro:
+        expansion = ''
+      
+      elif type(target) is UserMacro:
+        argv = []
+        
+        for i in range(target.argc):
+          if not text.startswith('{', end):
+            break
+          
+          result = lexBlock(text, end + 1)
+          
+          if result is None:
+            break
+          
+          value, end = result
+          argv.append(value)
+        
+        if len(argv) < target.argc:
+          break
+        
+        expansion = target.expand(*argv)
+      
+      else: # makra meni tabulku nebo rezim analyzatoru, nebo makro neexistuje
+        break
+      
+      if length + len(expansion) + len(text) - end > self.maxLength:
+        break
+      
+      text = expansion + text[end:]
+      pos = 0
+      steps += 1
+    
+    return ''.join(done) + text[pos:]
@@ -7,42 +7,17 @@ import processor
 from processor import Processor
 
 import macro
+from stats import Stats
+from config import *
+
+# moduly davkoveho zpracovani, serveru, proudu dokumentu, knihoven a cache vysledku jsou
+# importovany az v prislusnych vetvich, samostatny beh tak nenacita napr. multiprocessing
 
-SYNTAX_ERR = 55
-SEMANTIC_ERR = 56
-REDEF_ERR = 57
-INVALID_ARG_ERR = 1
-READ_FILE_ERR = 2
-WRITE_FILE_ERR = 3
 #
 # Definice vyjimek
 class InvalidArgsError(Exception): pass
 
 
-class ConfigSet:
-  ''' Ridici struktura, obsahuje konfiguraci aktualniho behu programu. '''
-  
-  def __init__(self, options):
-    self.options = options
-    
-  def __getitem__(self, key):
-    return self.options[key]
-  
-  def __setitem__(self, key, val):
-    self.options[key] = val
-    
-  def isHelp(self):
-    return self.options['help']
-
-  def __str__(self):
-    ret = ""
-    
-    for i in self.options.items():
-      ret += str(i[0]) + " : " + str(i[1])
-      ret += '\n';
-      
-    return ret
-  
 def help():
   s  = "Jednoduchy makroprocesor JMP - ovladani:\n"
   s += "  --help              Vytiskne napovedu - nelze kombinovat\n"
@@ -50,6 +25,23 @@ def help():
   s += "  --output=filename   Definuje vystupni soubor (implicine stdout)\n"
   s += "  --cmd=text          Vlozi 'text' na zacatek vystupni sekvence\n"
   s += "  -r                  Redefinice makra pomoci @def skonci s chybou\n"
+  s += "  --ascii             Vstup i vystup cte a zapisuje jako bajty ASCII, jiny vstup skonci chybou 2\n"
+  s += "  --engine=text|regex Lexikalni analyzator: po znacich (implicitne) nebo rizeny regularnimi vyrazy\n"
+  s += "  --inline            Vnorena volani maker na zacatku tel maker nahradi predem jejich expanzi\n"
+  s += "  --library=filename\n"
+  s += "                      Knihovna maker zpracovana pred vstupem (s cache v $JMP_CACHE_DIR)\n"
+  s += "  --cache-dir=dir     Vysledky zpracovani uklada do cache v adresari dir a pouziva je znovu\n"
+  s += "  --cache-size=N      Nejvetsi velikost cache vysledku v MiB (implicitne 256)\n"
+  s += "  --serve=socket      Spusti server zpracovavajici pozadavky klienta jmpc.py na Unix socketu\n"
+  s += "  --batch=glob        Zpracuje vsechny soubory odpovidajici vzoru (@soubor = seznam souboru)\n"
+  s += "  --outdir=dir        Adresar pro vystupy davkoveho zpracovani\n"
+  s += "  --jobs=N            Pocet paralelnich procesu davkoveho zpracovani nebo serveru\n"
+  s += "  --stream            Zpracuje proud dokumentu: pozadavky a odpovedi v JSON Lines na stdin/stdout\n"
+  s += "  --max-expansions=N  Ukonci zpracovani s chybou 58 po vice nez N expanzich maker\n"
+  s += "  --max-input=N       Limit velikosti neprectenych expanzi maker na vstupu (ve znacich)\n"
+  s += "  --max-output=N      Limit velikosti vystupu (ve znacich)\n"
+  s += "  --timeout=S         Limit doby zpracovani v sekundach\n"
+  s += "  --stats[=filename]  Statistiky expanzi maker vytiskne na stderr (do souboru ve formatu JSON)\n"
   
   return s
  
@@ -61,14 +53,6 @@ def argparse(argv):
   Vraci instanci tridy ConfigSet, ktera zapouzdruje hodnoty argumentu - pripadne jejich implicitni hodnoty.
   """
   
-  default = {
-      'help'   : False,
-      'input'  : False,
-      'output' : False,
-      'cmd'    : "",
-      'r'      : False
-            }
-  
   userArgs = {}
   
   for arg in argv[1:]:
@@ -94,20 +78,182 @@ def argparse(argv):
     
     elif arg == '-r':
       userArgs['r'] = True
+    
+    elif arg.startswith('--library='):
+      userArgs['library'] = arg[10:]
+      if not userArgs['library']: # je prazdny?
+        raise InvalidArgsError("Missing value for --library argument.")
+      
+    elif arg.startswith('--cache-dir='):
+      userArgs['cache-dir'] = arg[12:]
+      if not userArgs['cache-dir']: # je prazdny?
+        raise InvalidArgsError("Missing value for --cache-dir argument.")
+      
+    elif arg.startswith('--cache-size='):
+      try:
+        userArgs['cache-size'] = int(arg[13:])
+      except ValueError:
+        raise InvalidArgsError("Invalid value for --cache-size argument.")
+      
+      if userArgs['cache-size'] < 0:
+        raise InvalidArgsError("Invalid value for --cache-size argument.")
+      
+    elif arg.startswith('--serve='):
+      userArgs['serve'] = arg[8:]
+      if not userArgs['serve']: # je prazdny?
+        raise InvalidArgsError("Missing value for --serve argument.")
+      
+    elif arg.startswith('--batch='):
+      userArgs['batch'] = arg[8:]
+      if not userArgs['batch']: # je prazdny?
+        raise InvalidArgsError("Missing value for --batch argument.")
+      
+    elif arg.startswith('--outdir='):
+      userArgs['outdir'] = arg[9:]
+      if not userArgs['outdir']: # je prazdny?
+        raise InvalidArgsError("Missing value for --outdir argument.")
+      
+    elif arg.startswith('--jobs='):
+      try:
+        userArgs['jobs'] = int(arg[7:])
+      except ValueError:
+        raise InvalidArgsError("Invalid value for --jobs argument.")
+      
+      if userArgs['jobs'] < 1:
+        raise InvalidArgsError("Invalid value for --jobs argument.")
+      
+    elif arg == '--ascii':
+      userArgs['ascii'] = True
+      
+    elif arg == '--inline':
+      userArgs['inline'] = True
+      
+    elif arg == '--stream':
+      userArgs['stream'] = True
+      
+    elif arg.startswith('--engine='):
+      userArgs['engine'] = arg[9:]
+      if userArgs['engine'] not in ('text', 'regex'):
+        raise InvalidArgsError("Invalid value for --engine argument.")
+      
+    elif arg.startswith(('--max-expansions=', '--max-input=', '--max-output=', '--timeout=')):
+      name, value = arg[2:].split('=', 1)
+      
+      try:
+        userArgs[name] = float(value) if name == 'timeout' else int(value)
+      except ValueError:
+        raise InvalidArgsError("Invalid value for --{} argument.".format(name))
+      
+      if userArgs[name] < 0:
+        raise InvalidArgsError("Invalid value for --{} argument.".format(name))
+      
+    elif arg == '--stats':
+      userArgs['stats'] = True
+      
+    elif arg.startswith('--stats='):
+      userArgs['stats'] = arg[8:]
+      if not userArgs['stats']: # je prazdny?
+        raise InvalidArgsError("Missing value for --stats argument.")
       
     else:
       raise InvalidArgsError("Neznamy parametr: {}".format(arg))
     
     
-  res = dict(list(default.items()) + list(userArgs.items()))
+  res = dict(list(DEFAULTS.items()) + list(userArgs.items()))
   
   if 'help' in userArgs.keys() and len(userArgs) > 1:
     raise InvalidArgsError("Invalid argument combination.")
   
+  # rezim ASCII jen pro samostatny beh, --cmd je soucasti vystupu
+  if res['ascii'] and (res['batch'] or res['serve'] or res['stream']):
+    raise InvalidArgsError("Invalid argument combination.")
+  
+  if res['ascii'] and not res['cmd'].isascii():
+    raise InvalidArgsError("Argument --cmd has to be ASCII text in --ascii mode.")
+  
+  # davka ma vlastni vstupy a vystupy
+  if bool(res['batch']) != bool(res['outdir']):
+    raise InvalidArgsError("Arguments --batch and --outdir have to be used together.")
+  
+  if res['batch'] and (res['input'] or res['output'] or res['stats']):
+    raise InvalidArgsError("Invalid argument combination.")
+  
+  # server prijima vstupy od klientu
+  if res['serve'] and (res['batch'] or res['input'] or res['output'] or res['cmd'] or res['r'] or res['stats']
+                       or 'engine' in userArgs or res['inline']):
+    raise InvalidArgsError("Invalid argument combination.")
+  
+  # proud dokumentu na standardnim vstupu a vystupu
+  if res['stream'] and (res['batch'] or res['serve'] or res['input'] or res['output']):
+    raise InvalidArgsError("Invalid argument combination.")
+  
+  # cache vysledku jen pro samostatny beh
+  if res['cache-dir'] and (res['batch'] or res['serve'] or res['stream']):
+    raise InvalidArgsError("Invalid argument combination.")
+  
+  if 'cache-size' in userArgs and not res['cache-dir']:
+    raise InvalidArgsError("Argument --cache-size requires --cache-dir.")
+  
+  if res['jobs'] is not None and not (res['batch'] or res['serve']):
+    raise InvalidArgsError("Argument --jobs requires --batch or --serve.")
+  
   
   return ConfigSet(res)
 
 
+def process(proc, fh, cache=None):
+  ''' Zpracuje vstup makroprocesoru proc do souboru fh, volitelne s pouzitim cache vysledku
+  (instance results.ResultCache). V rezimu --ascii je fh binarni soubor. Pri chybe ukonci
+  program s prislusnym navratovym kodem. '''
+  sink = processor.FileSink(fh, encoding='ascii' if proc.cfg['ascii'] else None)
+  
+  try:
+    if cache is None:
+      proc.process(sink=sink)
+    else:
+      import results
+      
+      sink.write(results.process(proc, cache))
+      sink.flush()
+  except Exception as err:
+    code = errorCode(err)
+    
+    if code is None:
+      raise
+    
+    print(err, file=sys.stderr)
+    sys.exit(code)
+
+
+def loadLibrary(path, restrict):
+  ''' Nacte knihovnu maker. Pri chybe ukonci program s kodem odpovidajicim chybe ve vstupu. '''
+  import library
+  
+  try:
+    return library.loadLibrary(path, restrict)
+  except Exception as err:
+    code = errorCode(err)
+    
+    if code is None:
+      raise
+    
+    print("{}: {}".format(path, err), file=sys.stderr)
+    sys.exit(code)
+
+
+def writeStats(stats, target):
+  ''' Vypise statistiky behu: hodnota True znamena tabulku na stderr, jinak jmeno souboru pro JSON '''
+  if target is True:
+    print(stats.table(), end="", file=sys.stderr)
+    return
+  
+  try:
+    with open(target, 'w') as f:
+      f.write(stats.json() + '\n')
+  except Exception as err:
+    print(err, file=sys.stderr)
+    
+
 # ---------------------------------------------------------------
 # Hlavni pristupovy bod programu
 # ---------------------------------------------------------------
@@ -131,49 +277,92 @@ if __name__ == '__main__':
     print( help(), end="" )
     sys.exit(0)
     
+  # server - knihovna je zpracovana predem, aby pripadna chyba byla nahlasena hned
+  if cfg['serve']:
+    import server
+    
+    if cfg['library']:
+      loadLibrary(cfg['library'], False)
+      
+    server.serve(cfg['serve'], cfg['library'], cfg['jobs'], limits(cfg))
+    sys.exit(0)
+  
+  # davkove zpracovani
+  if cfg['batch']:
+    import batch
+    
+    try:
+      inputs = batch.collectInputs(cfg['batch'])
+    except Exception as err:
+      print(err, file=sys.stderr)
+      sys.exit(READ_FILE_ERR)
+    
+    # knihovna je zpracovana jednou predem, procesy davky ji pak nacitaji z cache
+    if cfg['library']:
+      loadLibrary(cfg['library'], cfg['r'])
+      
+    results = batch.runBatch(inputs, cfg['outdir'], cfg['cmd'], cfg['r'], cfg['jobs'], cfg['library'], limits(cfg),
+                             cfg['engine'], cfg['inline'])
+    
+    print(batch.summary(results), end="", file=sys.stderr)
+    sys.exit(batch.exitCode(results))
+  
   # spust makroprocesor
+  stats = Stats() if cfg['stats'] else None
+  
   try:
-    proc = Processor(cfg)
+    proc = Processor(cfg, stats=stats, governor=governor(limits(cfg)))
   except (macro.IllegalMacroRedefinition) as err:
     print(err, file=sys.stderr)
     sys.exit(REDEF_ERR)
   
+  if cfg['library']:
+    proc.useLibrary(loadLibrary(cfg['library'], cfg['r']))
+  
+  # proud dokumentu, kazdy zacina ve stavu po zpracovani knihovny
+  if cfg['stream']:
+    import stream
+    
+    try:
+      code = stream.stream(proc, sys.stdin.buffer, sys.stdout.buffer, cfg['cmd'])
+    finally:
+      if stats is not None:
+        writeStats(stats, cfg['stats'])
+    
+    sys.exit(code)
+  
   try:
     proc.readfile()
   except Exception as ex:
     print( ex, file=sys.stderr )
     sys.exit( READ_FILE_ERR )
     
-  # pokus se zpracovat soubor  
-  try:
-    output = proc.process()
-  except (processor.BlockNotClosedError, processor.IllegalCharSequenceError, SyntaxError) as err:
-    print( err, file=sys.stderr )
-    sys.exit(SYNTAX_ERR)
-  
-  # kazda vyjimka nese informaci o chybe
-  except (macro.UnknownMacroError, processor.ArgumentsError, macro.MacroNotDefinedError) as err:
-    print(err, file=sys.stderr)
-    sys.exit(SEMANTIC_ERR)
-  
-  except(macro.IllegalMacroRedefinition) as err:
-    print(err, file=sys.stderr)
-    sys.exit(REDEF_ERR)
-    
-    
-    # ziskej deskriptor pro vystupni soubor ( stdout | soubor na disku )
+  # ziskej deskriptor pro vystupni soubor ( stdout | soubor na disku )
   if cfg['output'] == False:
-    fh = sys.stdout
+    fh = sys.stdout.buffer if cfg['ascii'] else sys.stdout
   else:
     
     try:
-      fh = open(cfg['output'], 'w')
+      fh = open(cfg['output'], 'wb' if cfg['ascii'] else 'w')
     except Exception as err:
       print(err, file=sys.stderr)
       sys.exit(WRITE_FILE_ERR)
   
-
-  fh.write(output)
+  # cache vysledku celych dokumentu
+  cache = None
+  
+  if cfg['cache-dir']:
+    import results
+    
+    cache = results.ResultCache(cfg['cache-dir'], cfg['cache-size'] << 20)
+  
+  # pokus se zpracovat soubor, vystup je do souboru zapisovan prubezne
+  try:
+    process(proc, fh, cache)
+  finally:
+    if stats is not None:
+      writeStats(stats, cfg['stats'])
   
   fh.close()
   
+
@@ -0,0 +1,145 @@
+#!/usr/bin/python3
+
+#JMP:xkovar66
+''' Tenky klient pro server makroprocesoru (jmp.py --serve). Prijima stejne argumenty jako jmp.py,
+vstup nacte lokalne, necha jej zpracovat serverem a vystup i navratovy kod preda stejne jako jmp.py.
+Zamerne nezavisi na modulech makroprocesoru, aby jeho spusteni bylo co nejlevnejsi.
+
+Cesta k socketu serveru se zadava argumentem --socket=path nebo promennou prostredi JMP_SOCKET.
+'''
+
+import json
+import os
+import socket
+import struct
+import sys
+
+INVALID_ARG_ERR = 1
+READ_FILE_ERR = 2
+WRITE_FILE_ERR = 3
+CONNECT_ERR = 4
+
+# zprava protokolu: delka (4 B, big endian) a JSON v kodovani UTF-8
+HEADER = struct.Struct('>I')
+
+
+def sendMessage(sock, obj):
+  data = json.dumps(obj).encode('utf-8')
+  sock.sendall(HEADER.pack(len(data)) + data)
+  
+  
+def recvExact(sock, n):
+  ''' Precte presne n bajtu, None pokud protistrana uzavrela spojeni pred prvnim bajtem '''
+  chunks = []
+  
+  while n:
+    chunk = sock.recv(min(n, 1 << 20))
+    
+    if not chunk:
+      if chunks:
+        raise ConnectionError("Connection closed in the middle of a message")
+      return None
+    
+    chunks.append(chunk)
+    n -= len(chunk)
+    
+  return b''.join(chunks)
+
+
+def recvMessage(sock):
+  ''' Precte jednu zpravu, None na konci spojeni '''
+  header = recvExact(sock, HEADER.size)
+  
+  if header is None:
+    return None
+  
+  data = recvExact(sock, HEADER.unpack(header)[0])
+  
+  if data is None:
+    raise ConnectionError("Connection closed in the middle of a message")
+  
+  return json.loads(data.decode('utf-8'))
+
+
+def request(path, text, cmd="", restrict=False):
+  ''' Necha server na socketu path zpracovat text. Vraci slovnik s klici output, code a error. '''
+  with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+    sock.connect(path)
+    sendMessage(sock, {'input': text, 'cmd': cmd, 'r': restrict})
+    
+    response = recvMessage(sock)
+    
+  if response is None:
+    raise ConnectionError("Server closed the connection")
+  
+  return response
+
+
+def argparse(argv):
+  ''' Zpracuje argumenty shodne s jmp.py. Vraci slovnik voleb, pri chybe None. '''
+  opts = {'input': False, 'output': False, 'cmd': "", 'r': False,
+          'socket': os.environ.get('JMP_SOCKET'), 'help': False}
+  
+  for arg in argv[1:]:
+    for name in ('input', 'output', 'cmd', 'socket'):
+      prefix = '--{}='.format(name)
+      
+      if arg.startswith(prefix) and arg[len(prefix):]:
+        opts[name] = arg[len(prefix):]
+        break
+      
+    else:
+      if arg == '-r':
+        opts['r'] = True
+      elif arg == '--help' and len(argv) == 2:
+        opts['help'] = True
+      else:
+        return None
+      
+  return opts
+
+
+if __name__ == '__main__':
+  
+  opts = argparse(sys.argv)
+  
+  if opts is None:
+    print("Invalid arguments.", file=sys.stderr)
+    sys.exit(INVALID_ARG_ERR)
+    
+  if opts['help']:
+    print("Klient makroprocesoru JMP - argumenty shodne s jmp.py, navic:\n"
+          "  --socket=path       Socket serveru (implicitne $JMP_SOCKET)")
+    sys.exit(0)
+    
+  if not opts['socket']:
+    print("Missing server socket (--socket or JMP_SOCKET).", file=sys.stderr)
+    sys.exit(INVALID_ARG_ERR)
+  
+  try:
+    if opts['input']:
+      with open(opts['input'], 'r') as f:
+        text = f.read()
+    else:
+      text = sys.stdin.read()
+  except Exception as err:
+    print(err, file=sys.stderr)
+    sys.exit(READ_FILE_ERR)
+    
+  try:
+    response = request(opts['socket'], text, opts['cmd'], opts['r'])
+  except (OSError, ValueError) as err:
+    print(err, file=sys.stderr)
+    sys.exit(CONNECT_ERR)
+    
+  if response['code']:
+    print(response['error'], file=sys.stderr)
+    sys.exit(response['code'])
+  
+  try:
+    fh = open(opts['output'], 'w') if opts['output'] else sys.stdout
+    fh.write(response['output'])
+    fh.close()
+  except Exception as err:
+    print(err, file=sys.stderr)
+    sys.exit(WRITE_FILE_ERR)
@@ -0,0 +1,163 @@
+#JMP:xkovar66
+''' Predzpracovane knihovny maker. Knihovna (prelude) je zpracovana jednou, vysledna tabulka maker
+vcetne definic uzivatelskych maker je ulozena ve formatu JSON do souboru v adresari cache. Dalsi behy
+nactou tabulku primo, bez opetovneho zpracovani definic. Soubor obsahuje pouze data, jeho nacteni
+tedy nemuze spustit kod ani ve sdilenem adresari cache. Klicem cache je hash obsahu knihovny,
+priznak -r a razitko verze zdrojovych kodu makroprocesoru, zmena knihovny tak cache zneplatni.
+
+Knihovna musi byt samostatny dokument - nesmi koncit neuplnym makrem, ktere by ocekavalo
+argumenty az ze zpracovavaneho vstupu.
+'''
+
+import hashlib
+import json
+import os
+import tempfile
+
+import config
+import macro
+import processor
+from processor import Processor
+
+
+class Library:
+  ''' Stav makroprocesoru po zpracovani knihovny: tabulka maker, rezim bilych znaku a vystup. '''
+  
+  def __init__(self, table, whitespaceIgnored, output):
+    self.table = table
+    self.whitespaceIgnored = whitespaceIgnored
+    self.output = output
+    self.key = None # klic cache knihovny (viz libraryKey), nastavuje loadLibrary
+    
+
+def codeStamp():
+  ''' Razitko verze makroprocesoru - hash zdrojovych kodu modulu, na kterych zavisi vysledek '''
+  digest = hashlib.sha256()
+  
+  for module in (processor, macro):
+    with open(module.__file__, 'rb') as f:
+      digest.update(f.read())
+      
+  return digest.hexdigest()[:16]
+
+
+def cacheDir():
+  ''' Adresar cache: promenna prostredi JMP_CACHE_DIR, implicitne ~/.cache/jmp '''
+  return os.environ.get('JMP_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'jmp')
+
+
+def libraryKey(text, restrict):
+  digest = hashlib.sha256()
+  digest.update(codeStamp().encode())
+  digest.update(b'-r' if restrict else b'--')
+  digest.update(text.encode('utf-8', 'surrogatepass'))
+  
+  return digest.hexdigest()
+
+
+# vestavena makra: druh v souboru cache -> trida
+BUILTINS = {'null': macro.NullMacro, 'let': macro.LetMacro, 'set': macro.SetMacro, 'def': macro.DefMacro}
+
+
+def dumpLibrary(library):
+  ''' Vrati knihovnu jako data JSON. Makro svazane s vice jmeny (@let) je ulozeno jednou, jmena
+  odkazuji na jeho index v seznamu maker. '''
+  kinds = {cls: kind for kind, cls in BUILTINS.items()}
+  macros = []
+  indexes = {}
+  names = {}
+  
+  for name, value in library.table.asDict().items():
+    if id(value) not in indexes:
+      indexes[id(value)] = len(macros)
+      
+      if type(value) is macro.UserMacro:
+        macros.append(['user'] + list(value.definition))
+      elif type(value) in kinds:
+        macros.append([kinds[type(value)]])
+      else:
+        macros.append(['text', value])
+    
+    names[name] = indexes[id(value)]
+  
+  return json.dumps({'macros': macros, 'names': names, 'whitespaceIgnored': library.whitespaceIgnored,
+                     'output': library.output}).encode('utf-8')
+
+
+def parseLibrary(data, restrict):
+  ''' Vytvori knihovnu z dat funkce dumpLibrary. Pri chybnych datech vyhazuje vyjimku. '''
+  data = json.loads(data.decode('utf-8'))
+  macros = []
+  
+  for kind, *args in data['macros']:
+    if kind == 'user':
+      argc, name, params, bindings, body = args
+      macros.append(macro.UserMacro(argc, name, params, [tuple(binding) for binding in bindings], body))
+    elif kind == 'text':
+      macros.append(args[0])
+    else:
+      macros.append(BUILTINS[kind]())
+  
+  table = macro.MacroTable.fromDict({name: macros[index] for name, index in data['names'].items()}, restrict)
+  
+  return Library(table, bool(data['whitespaceIgnored']), str(data['output']))
+
+
+def compileLibrary(text, restrict):
+  ''' Zpracuje text knihovny a vrati instanci Library. Chyby zpracovani jsou propagovany. '''
+  cfg = config.defaults()
+  cfg['r'] = restrict
+  
+  proc = Processor(cfg)
+  output = proc.process(text)
+  
+  return Library(proc.macroTable, proc.scanner.whitespaceIgnored, output)
+
+
+def writeAtomic(path, data):
+  ''' Zapise data do souboru atomicky (docasny soubor a prejmenovani), soubeznym ctenarum
+  se tak nikdy neukaze nekompletni soubor. '''
+  directory = os.path.dirname(path)
+  os.makedirs(directory, exist_ok=True)
+  
+  fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+  
+  try:
+    with os.fdopen(fd, 'wb') as f:
+      f.write(data)
+      
+    os.replace(tmp, path)
+  except BaseException:
+    try:
+      os.unlink(tmp)
+    except OSError:
+      pass
+    raise
+
+
+def loadLibrary(path, restrict, directory=None):
+  ''' Vrati knihovnu maker ze souboru path. Pouzije serializovanou tabulku z cache, pokud existuje,
+  jinak knihovnu zpracuje a do cache ulozi. Chyba pri praci s cache neni fatalni. '''
+  with open(path, 'r') as f:
+    text = f.read()
+    
+  key = libraryKey(text, restrict)
+  cachePath = os.path.join(directory or cacheDir(), 'lib-' + key + '.json')
+  
+  try:
+    with open(cachePath, 'rb') as f:
+      library = parseLibrary(f.read(), restrict)
+      library.key = key
+      return library
+  except Exception:
+    pass
+  
+  library = compileLibrary(text, restrict)
+  library.key = key
+  
+  try:
+    writeAtomic(cachePath, dumpLibrary(library))
+  except Exception:
+    pass
+  
+  return library
@@ -5,6 +5,8 @@
 from abc import ABCMeta, abstractmethod
 
 import re, processor
+from collections import OrderedDict
+from itertools import count
 
 
 class UnknownMacroError(Exception): pass
@@ -12,13 +14,57 @@ class IllegalMacroRedefinition(Exception): pass
 class MacroNotDefinedError(Exception): pass
 class ArgumentsError(Exception): pass
 
+# verze tabulek maker jsou jedinecne v ramci procesu, vysledky ulozene v ExpansionCache tak
+# nemohou byt pouzity s jinou tabulkou (napr. s jinou vetvi stejne tabulky)
+versions = count(1)
+
+class MacroLayer:
+  ''' Zmrazena vrstva tabulky maker sdilena rozvetvenymi tabulkami (viz MacroTable.fork).
+  Obsahuje zmeny oproti rodicovske vrstve, smazana makra maji hodnotu None. Pri prvnim cteni
+  je vrstva sloucena se vsemi rodici do jednoho slovniku, ktery pak sdileji vsechny tabulky. '''
+  
+  def __init__(self, parent, changes):
+    self.__parent = parent
+    self.__changes = changes
+    self.__macros = None
+  
+  @property
+  def macros(self):
+    ''' Slovnik vsech maker vrstvy vcetne zdedenych (bez smazanych), nesmi byt menen '''
+    if self.__macros is None:
+      # vrstvy az po nejblizsi jiz sloucenou, bez rekurze i pro dlouhe retezy vetveni
+      layers = []
+      layer = self
+      
+      while layer is not None and layer.__macros is None:
+        layers.append(layer)
+        layer = layer.__parent
+      
+      macros = {} if layer is None else dict(layer.__macros)
+      
+      for layer in reversed(layers):
+        for key, val in layer.__changes.items():
+          if val is None:
+            macros.pop(key, None)
+          else:
+            macros[key] = val
+      
+      self.__macros = macros
+      self.__parent = self.__changes = None
+    
+    return self.__macros
+
+
 class MacroTable:
   ''' Tablulka maker. Zpristupnuje definici makra na zaklade jeho jmena a umoznuje
-  s nimi manipulovat. Implicitne obsahuje definici vestavenych maker. '''
+  s nimi manipulovat. Implicitne obsahuje definici vestavenych maker.
+  
+  Tabulku lze levne rozvetvit (fork): obsah je zmrazen do sdilene vrstvy (MacroLayer) a kazda
+  tabulka zapisuje jen do sve vrstvy zmen. '''
   
   def __init__(self, restrict = False):
     
-    self.__macros = {}
+    self.__macros = {} # vlastni vrstva zmen, smazana zdedena makra maji hodnotu None
     self.__macros['ahoj'] = ""
     self.__restrict = restrict
     
@@ -30,33 +76,149 @@ class MacroTable:
     
     self.__immutable = ['@__def__', '@__set__', '@__let__']
     
+    self.__layer = None # zdedena zmrazena vrstva
+    self.__version = next(versions) # meni se pri kazde zmene tabulky
+    
+  @property
+  def version(self):
+    ''' Verze tabulky, zmeni se s kazdou upravou tabulky nebo rezimu zpracovani '''
+    return self.__version
+  
+  def touch(self):
+    ''' Oznami zmenu, ktera zneplatnuje vysledky ziskane s predchozi verzi tabulky (napr. @set) '''
+    self.__version = next(versions)
+    
+  def fork(self):
+    ''' Vrati novou tabulku se stejnym obsahem a pravidly (-r, nemenna makra) v case O(1).
+    Dosavadni obsah je zmrazen do sdilene vrstvy, zmeny jedne tabulky se neprojevi v druhe. '''
+    if self.__macros or self.__layer is None:
+      self.__layer = MacroLayer(self.__layer, self.__macros)
+      self.__macros = {}
+    
+    table = MacroTable.__new__(MacroTable)
+    table.__macros = {}
+    table.__restrict = self.__restrict
+    table.__immutable = self.__immutable
+    table.__layer = self.__layer
+    table.__version = next(versions)
+    
+    return table
+  
+  @classmethod
+  def fromDict(cls, macros, restrict = False):
+    ''' Vrati tabulku s obsahem macros (jmeno -> makro) a pravidly -r, napr. pri nacteni ulozene
+    knihovny. Obsah neni kontrolovan pravidly redefinice. '''
+    table = cls(restrict)
+    table.__macros = dict(macros)
+    
+    return table
+  
+  def asDict(self):
+    ''' Vrati slovnik vsech maker tabulky vcetne zdedenych (jmeno -> makro) '''
+    macros = {} if self.__layer is None else dict(self.__layer.macros)
+    
+    for key, val in self.__macros.items():
+      if val is None:
+        del macros[key]
+      else:
+        macros[key] = val
+    
+    return macros
       
   def exists(self, key):
     ''' Zjisti, zda makro daneho jmena existuje v tabulce '''
-    return key in self.__macros.keys()
+    macros = self.__macros
+    
+    if key in macros:
+      return macros[key] is not None
+    
+    return self.__layer is not None and key in self.__layer.macros
   
   @property
   def immutable(self):
     return tuple(self.__immutable)
   
   def __delitem__(self, key):
-    del self.__macros[key]
+    if not self.exists(key):
+      raise KeyError(key)
+    
+    if self.__layer is not None and key in self.__layer.macros:
+      self.__macros[key] = None # zdedene makro prekryje znacka smazani
+    else:
+      del self.__macros[key]
+      
+    self.touch()
   
   def __getitem__(self, key):
-    return self.__macros[key]
+    macros = self.__macros
+    
+    if key in macros:
+      val = macros[key]
+      
+      if val is None:
+        raise KeyError(key)
+      
+      return val
+    
+    if self.__layer is None:
+      raise KeyError(key)
+    
+    return self.__layer.macros[key]
   
   def __setitem__(self, key, val):
     
-    if self.__restrict and key in self.__macros.keys():
+    if self.__restrict and self.exists(key):
       raise IllegalMacroRedefinition("Macro redefinition is forbid in restrict mode")
     
     if key in self.__immutable:
       raise IllegalMacroRedefinition("Macro {} can not be redefined".format(key))
     
     self.__macros[key] = val
+    self.touch()
     
   def __str__(self):
-    return str(self.__macros)
+    return str(self.asDict())
+
+class ExpansionCache:
+  ''' LRU cache vysledku expanzi uzivatelskych maker o omezene velikosti. Klicem je makro a n-tice
+  jeho argumentu, polozka je platna pouze pro verzi tabulky maker, se kterou byla ulozena. '''
+  
+  def __init__(self, size=1024):
+    self.size = size
+    self.hits = 0
+    self.misses = 0
+    self.__entries = OrderedDict()
+    
+  def get(self, macro, argv, version):
+    ''' Vrati ulozeny vysledek expanze, nebo None, pokud neexistuje nebo je neplatny '''
+    key = (macro, argv)
+    entry = self.__entries.get(key)
+    
+    if entry is None or entry[0] != version:
+      self.misses += 1
+      return None
+    
+    self.__entries.move_to_end(key)
+    self.hits += 1
+    
+    return entry[1]
+  
+  def put(self, macro, argv, version, result):
+    ''' Ulozi vysledek expanze, pri prekroceni velikosti odstrani nejdele nepouzitou polozku '''
+    key = (macro, argv)
+    
+    self.__entries[key] = (version, result)
+    self.__entries.move_to_end(key)
+    
+    if len(self.__entries) > self.size:
+      self.__entries.popitem(last=False)
+      
+  def stats(self):
+    return {'hits': self.hits, 'misses': self.misses, 'size': len(self.__entries)}
+  
+  def __len__(self):
+    return len(self.__entries)
+  
 
 class Macro():
   ''' Bazova trida pro definice maker. Definuje protokol jednotlivych maker.'''  
@@ -68,7 +230,7 @@ class Macro():
   @property
   def argc(self):
     return self.__argc
-
+  
   @property
   def name(self):
     return self.__name
@@ -126,7 +288,7 @@ class SetMacro(Macro):
   rezim cteni / ignorovani bilych znaku.'''
   def __init__(self):
     Macro.__init__(self, 1, 'SetMacro')
-
+  
   def expand(self, scanner, val):
     ''' Makro akceptuje pouze argumenty +/-INPUT_SPACES. Po textove strance je expandovano
     na prazdny retezec. '''
@@ -192,6 +354,27 @@ class UserMacro(Macro):
     self.__bindigs = sorted(bindings, key=lambda arg: arg[0], reverse=True)
     self.__body = body
     self.__name = name
+    
+    self.__compile()
+  
+  def __compile(self):
+    ''' Prevede telo makra na sablonu - seznam useku textu, ve kterem jsou vyskyty parametru
+    nahrazeny prazdnymi misty. Sloty jsou dvojice (index v sablone, index argumentu). '''
+    parts = []
+    slots = []
+    last = 0
+    
+    for start, name in reversed(self.__bindigs):
+      parts.append(self.__body[last:start])
+      slots.append( (len(parts), self.args.index(name)) )
+      parts.append(None)
+      
+      last = start + len(name)
+      
+    parts.append(self.__body[last:])
+    
+    self.__parts = parts
+    self.__slots = tuple(slots)
   
   @property
   def body(self):
@@ -200,19 +383,37 @@ class UserMacro(Macro):
   @property
   def args(self):
     return self.__args
+  
+  @property
+  def definition(self):
+    ''' Argumenty konstruktoru, ze kterych lze makro vytvorit znovu: (argc, jmeno, parametry,
+    vazby, telo) '''
+    return self.argc, self.__name, self.__args, self.__bindigs, self.__body
+  
+  @property
+  def template(self):
+    ''' Dvojice (useky sablony, sloty), viz __compile '''
+    return self.__parts, self.__slots
+    
+  def withHead(self, head):
+    ''' Vrati makro se stejnymi parametry, jehoz telo ma text pred prvnim parametrem nahrazen
+    textem head '''
+    shift = len(head) - len(self.__parts[0])
+    bindings = [(start + shift, name) for start, name in self.__bindigs]
+    
+    return UserMacro(self.argc, self.__name, self.__args, bindings, head + self.__body[len(self.__parts[0]):])
     
   def expand(self, *argv):
     ''' Textova expanze makra. Nahrazeni vsech vyskytu nazvu parametru jejich hodnotou '''
     
-    res = self.__body
+    if not self.__slots:
+      return self.__body
     
-    for bind in self.__bindigs:
-
-      start = bind[0]
-      length = len(bind[1])
-      
-      res = res[:start] + argv[self.args.index(bind[1])] + res[start+length:]
+    parts = self.__parts[:]
+    
+    for i, arg in self.__slots:
+      parts[i] = argv[arg]
       
-       
-    return res
+    return ''.join(parts)
   
+
@@ -4,6 +4,10 @@
 
 import sys
 import re
+import time
+import io
+import itertools
+import collections
 
 from macro import *
 
@@ -15,18 +19,80 @@ class SyntaxClosedError(Exception): pass
 
 class TooFewArgumentsError(Exception): ''' Vyjimka popisujici neplatnou variaci vstupnich argumentu. ''' 
 
+class InputUnderflow(Exception):
+  ''' Dalsi usek vstupu zatim neni k dispozici (viz ChunkFeed) '''
+
+class OutputError(Exception):
+  ''' Vyjimka popisujici chybu zapisu vystupu (viz FileSink) '''
+
+class ResourceLimitError(Exception):
+  ''' Vyjimka popisujici prekroceni limitu zdroju. Nese nazev limitu a makro, ktere bylo
+  v dobe prekroceni expandovano (None, pokud zadne). '''
+  def __init__(self, limit, macro, message):
+    Exception.__init__(self, message)
+    self.limit = limit
+    self.macro = macro
+
 
 class Processor:
   ''' Trida reprezentujici makroprocesor jazyku JMP. Ridi veskerou praci jednotlivych sekci trasformace, 
   expanzi maker a predavani dat mezi jednotlivymi sekcemi. '''
-  def __init__(self, cfg):
+  
+  chunksize = 65536 # velikost useku, po kterych je cten vstup
+  
+  def __init__(self, cfg, cacheSize=0, stats=None, governor=None):
+    ''' S nenulovou hodnotou cacheSize jsou vysledky expanzi uzivatelskych maker ukladany
+    do LRU cache dane velikosti (viz cacheStats). Je-li zadana instance tridy Stats, jsou do ni
+    zaznamenavany statistiky expanzi jednotlivych maker. Instance tridy Governor omezuje
+    zdroje, ktere muze zpracovani spotrebovat. Polozka konfigurace 'engine' vybira lexikalni
+    analyzator: 'text' (Scanner) nebo 'regex' (relex.RegexScanner), polozka 'inline' zapina vkladani volani maker do tel maker
+    (inline.Inliner). '''
     self.cfg = cfg
     
     self.readfile = self.generateReadfile()
     
     self.macroTable = MacroTable( cfg['r'] )
     
+    self.cache = ExpansionCache(cacheSize) if cacheSize else None
+    self.stats = stats
+    self.governor = governor
+    self.library = None
+    
+    self.generateEngine()
+    
+    if cfg['inline']:
+      import inline
+      
+      self.inliner = inline.Inliner()
+    
+    else:
+      self.inliner = None
+    
+  def useLibrary(self, library):
+    ''' Zpracovani zacne ve stavu po zpracovani knihovny maker (instance library.Library):
+    s jeji tabulkou maker, rezimem bilych znaku a jejim vystupem na zacatku vystupu. Tabulka
+    knihovny je rozvetvena, knihovnu lze tedy pouzit pro libovolny pocet zpracovani. '''
+    self.library = library
+    self.macroTable = library.table.fork()
+    
+  def cacheStats(self):
+    ''' Vrati slovnik s pocty zasahu a minuti cache expanzi, None pokud cache neni pouzivana '''
+    if self.cache is None:
+      return None
+    
+    return self.cache.stats()
+    
     
+  def generateEngine(self):
+    ''' Nastavi tridu lexikalniho analyzatoru '''
+    if self.cfg['engine'] == 'regex':
+      import relex
+      
+      self.scannerClass = relex.RegexScanner
+      
+    else:
+      self.scannerClass = Scanner
+  
   def generateReadfile(self):
     """ Vraci volatelny objekt pro nacteni vstupu v zavislosti na tom, zda
     je vstupem soubor, nebo se cte ze standardniho vstupu """
@@ -38,36 +104,69 @@ class Processor:
       return self.readfile
     
   def readStdin(self):
-    ''' Precte veskery text ze standardniho vstupu do retezce. Tento retezec
-    ulozi do instancni promenne contents
+    ''' Pripravi cteni standardniho vstupu. Do instancni promenne contents ulozi iterator
+    postupne nacitanych useku vstupu. V rezimu --ascii je vstup cten po bajtech.
     '''
-    contents = ''
-    
-    while True:
-        try:
-            line = sys.stdin.readline()
-        except KeyboardInterrupt:
-            break
-    
-        if not line:
-            break
-    
-        contents += line
-        
-    self.contents = self.cfg['cmd'] + contents
+    if self.cfg['ascii']:
+      self.contents = self.asciiChunks(self.readChunks(sys.stdin.buffer))
+    else:
+      self.contents = self.readChunks(sys.stdin)
   
   def readfile(self):
-    ''' Nacte obsah souboru zadaneho v konfiguraci tridy. Obsah ulozi do instancni promenne
-    contents.
+    ''' Otevre soubor zadany v konfiguraci tridy. Do instancni promenne contents ulozi
+    iterator postupne nacitanych useku jeho obsahu. V rezimu --ascii je soubor cten po bajtech.
     '''
+    if self.cfg['ascii']:
+      self.contents = self.asciiChunks(self.readChunks(open(self.cfg['input'], 'rb')))
+    else:
+      self.contents = self.readChunks(open(self.cfg['input'], 'r'))
     
-    with open(self.cfg['input'], 'r') as f:
-      contents = f.read()
+  def asciiChunks(self, chunks):
+    ''' Generator useku textu z useku bajtu v kodovani ASCII (rezim --ascii). Kontrola kodovani
+    i dekodovani jsou jedinou operaci nad celym usekem, konce radku jsou prevedeny jako v textovem
+    rezimu. Bajt mimo ASCII ukonci cteni vyjimkou UnicodeError. '''
+    newlines = io.IncrementalNewlineDecoder(None, translate=True)
+    offset = 0
+    
+    for chunk in chunks:
+      if not chunk.isascii():
+        i = next(i for i, byte in enumerate(chunk) if byte > 127)
+        raise UnicodeError("Non-ASCII byte 0x{:02x} at offset {} of input (--ascii)".format(chunk[i], offset + i))
       
-    self.contents = self.cfg['cmd'] + contents
-
+      offset += len(chunk)
+      text = newlines.decode(chunk.decode('ascii'))
+      
+      if text:
+        yield text
+    
+    text = newlines.decode('', True)
+    
+    if text:
+      yield text
     
-    # pro kazdy argument provede jedno nacteni argument
+  def readText(self, text):
+    ''' Pouzije jako vstup retezec text (namisto souboru nebo standardniho vstupu) '''
+    self.contents = iter((text,))
+    
+  def readIterable(self, chunks):
+    ''' Pouzije jako vstup useky textu z iterovatelneho objektu chunks, ktere jsou cteny
+    prubezne behem zpracovani '''
+    self.contents = iter(chunks)
+    
+  def readChunks(self, f):
+    ''' Generator nacitajici vstup po usecich delky chunksize. Pamet je tak omezena velikosti
+    useku, nikoliv velikosti vstupu. Preruseni z klavesnice je povazovano za konec vstupu. '''
+    with f:
+      while True:
+        try:
+          chunk = f.read(self.chunksize)
+        except KeyboardInterrupt:
+          break
+        
+        if not chunk:
+          break
+        
+        yield chunk
     
   
   def expandMacro(self, macro):
@@ -109,11 +208,12 @@ class Processor:
           raise ArgumentsError('{0} expects arguments to be block'.format(macro.name))
       
       expansion = macro.expand(self.scanner, token[1])
+      self.macroTable.touch() # zmena rezimu meni podobu textu na vystupu
     
     # makro @def -> 3 argumenty: nazev bamkra, blok, blok
     elif mtype == DefMacro: 
       token = self.scanner.getToken()
-
+      
       # jmeno noveho makra 
       if token is None:
         raise ArgumentsError('{0} expects {1} arguments, but {2} were given'.format(macro.name, macro.argc, i))
@@ -152,43 +252,126 @@ class Processor:
       
     # uzivatelske makro
     elif mtype == UserMacro:
-      argv = []
+      expansion = self.expandUser(macro)[0]
       
-      for i in range(macro.argc): # macro.argc obsahuje pocet argument, ktere se maji nacist
-        token = self.scanner.getToken()
-        if token is None:
-          raise ArgumentsError("Too few arguments for macro '{}'".format(macro.name))
-        
-        argv.append(token[1])
+    return expansion    
+  
+  def expandUser(self, macro):
+    ''' Nacte argumenty uzivatelskeho makra a provede jeho expanzi. Vraci dvojici (expanze, vystup),
+    viz metoda classify. Je-li zapnuta cache, jsou vysledky pro stejne makro a argumenty
+    znovu pouzity. '''
+    argv = []
+    
+    for i in range(macro.argc): # macro.argc obsahuje pocet argument, ktere se maji nacist
+      token = self.scanner.getToken()
+      if token is None:
+        raise ArgumentsError("Too few arguments for macro '{}'".format(macro.name))
       
-      expansion = macro.expand(*argv)
+      argv.append(token[1])
+    
+    if self.cache is None:
+      return self.classify(macro.expand(*argv))
+    
+    argv = tuple(argv)
+    version = self.macroTable.version
+    result = self.cache.get(macro, argv, version)
+    
+    if result is None:
+      result = self.classify(macro.expand(*argv))
+      self.cache.put(macro, argv, version, result)
       
-    return expansion    
+    return result
+  
+  def classify(self, expansion):
+    ''' Vrati dvojici (expanze, vystup). Expanze bez ridicich znaku by se pri opetovnem cteni
+    pouze zkopirovala na vystup, vystup je pak text, ktery ma byt primo zapsan. Jinak je vystup None
+    a expanze musi byt vlozena zpet na vstup. '''
+    if self.scanner.re_special.search(expansion) is None:
+      return expansion, self.scanner.literal(expansion)
+    
+    return expansion, None
       
     
     
-  def process(self, string=None):
-    ''' Prijme retezec urceny ke zpracovani a vraci jeho podobu po kompletni expanzi  '''
+  def process(self, string=None, sink=None):
+    ''' Prijme retezec urceny ke zpracovani a zapisuje jeho podobu po kompletni expanzi do vystupu sink.
+    Neni-li sink zadan, je vystup shromazden a vracen jako retezec. '''
+    
+    collect = sink is None
+    
+    if collect:
+      sink = ListSink()
     
-    output = ""
+    self.begin(string, sink)
+    self.run()
     
+    if collect:
+      return sink.getvalue()
+    
+    sink.flush()
+    
+  def begin(self, string=None, sink=None, restartable=False):
+    ''' Pripravi zpracovani retezce string (neni-li zadan, pak --cmd a nacteneho vstupu) do vystupu
+    sink. Samotne zpracovani provadi metoda run, lze jej tak provest po castech. S parametrem
+    restartable muze zdroj useku vstupu vyhodit InputUnderflow, viz run. '''
+    # retezec --cmd je zpracovan jako samostatny ramec pred vstupem, neni tedy treba jej kopirovat
     if string is None:
-      string = self.contents
-      
-    content = ExtendableString(string)
+      content = InputStack(self.cfg['cmd'], self.contents)
+    else:
+      content = InputStack(string)
     
-    self.scanner = Scanner(content)
+    self.content = content
+    self.sink = sink
+    self.restartable = restartable
+    self.scanner = self.scannerClass(content)
     
-    while True:
-      # zpracovani makra probiha v jedne iteraci tohoto cyklu, proto v kazde iteraci vytvorime zalohu,
-      # je tedy garantovano, ze zaloha bude na konci zpracovani makra stale ta sama
-      pointerBck = content.createBackup() 
+    # stav po zpracovani knihovny maker (viz useLibrary)
+    if self.library is not None:
+      if self.library.whitespaceIgnored:
+        self.scanner.ignoreWhitespace()
+        
+      if self.library.output:
+        sink.write(self.library.output)
+    
+    # novy analyzator muze mit jiny rezim bilych znaku nez predchozi zpracovani, ulozene expanze
+    # (vystup bez bilych znaku) tak nelze pouzit
+    self.macroTable.touch()
+    
+    if self.governor is not None:
+      self.governor.start()
+    
+  def run(self, limit=None):
+    ''' Zpracuje nejvyse limit lexikalnich jednotek vstupu (pri None cely vstup). Vraci False,
+    pokud bylo zpracovani dokonceno, jinak True.
+    
+    Pri zpracovani zahajenem s restartable je pred kazdou jednotkou oznacen stav vstupu. Vstup
+    jednotky (vcetne argumentu makra) je cely precten drive, nez dojde k jakekoliv zmene stavu
+    zpracovani, vyjimka InputUnderflow tedy vrati vstup na zacatek rozpracovane jednotky a je
+    propagovana. Po doplneni vstupu lze ve zpracovani pokracovat dalsim volanim run. '''
+    try:
+      return self.runTokens(limit)
+    except InputUnderflow:
+      self.content.rollback()
+      raise
+    
+  def runTokens(self, limit):
+    ''' Smycka zpracovani metody run '''
+    content = self.content
+    sink = self.sink
+    stats = self.stats
+    governor = self.governor
+    inliner = self.inliner
+    restartable = self.restartable
+    
+    for i in itertools.count() if limit is None else range(limit):
+      if restartable:
+        content.mark()
+      
+      # nacti jednu lexikalni jednotku, obycejny text je nacitan po celych usecich
+      token = self.scanner.getToken(True)
       
-      # nacti jednu lexikalni jednotku
-      token = self.scanner.getToken()
-
       if token is None: # konec souboru
-        break
+        return False
       
       typ, value = token
       
@@ -197,19 +380,227 @@ class Processor:
         if not self.macroTable.exists(value):
           raise MacroNotDefinedError("Macro {} is not defined".format(value))
         
-        expansion = self.expandMacro(self.macroTable[value]) # epanduje makro
-        content.extend(expansion, pointerBck, content.pointer) # a pripoji expandovany retezec na zacatek vstupu
-
-        content.doBackup() # provede zalohu ukazatele na aktualne cteny znak
+        macro = self.macroTable[value]
+        
+        if stats is not None:
+          start = stats.clock()
+        
+        # epanduje makro
+        if type(macro) is UserMacro:
+          if inliner is not None:
+            macro = inliner.resolve(macro, self.macroTable)
+          
+          expansion, literal = self.expandUser(macro)
+        else:
+          expansion, literal = self.classify(self.expandMacro(macro))
+        
+        # expanze bez ridicich znaku je zapsana primo na vystup
+        if literal is not None:
+          if literal:
+            if governor is not None:
+              governor.wrote(len(literal))
+            
+            sink.write(literal)
+        
+        # makro i jeho argumenty uz byly ze vstupu precteny, expandovany retezec se tedy
+        # pouze vlozi jako novy ramec na vrchol vstupu
+        else:
+          content.pushback(expansion)
+          
+        if stats is not None:
+          stats.record(value, stats.clock() - start, len(expansion),
+                       0 if literal is not None else len(expansion), content.pending)
+          
+        if governor is not None:
+          governor.expanded(value, content.pushed)
         
       else:
-        output += value
+        if governor is not None:
+          governor.wrote(len(value))
+        
+        sink.write(value)
+          
+    return True
+ 
+class Governor:
+  ''' Omezeni zdroju jednoho zpracovani: celkovy pocet expanzi, velikost dosud neprectenych
+  expanzi vlozenych na vstup (ve znacich, bez samotneho vstupu, viz InputStack.pushed), velikost
+  vystupu a cas behu v sekundach. Hodnota None znamena bez omezeni.
+  Limity jsou kontrolovany pouze porovnanim citacu, cas je zjistovan jednou za checkInterval
+  expanzi a take vzdy, kdyz objem textu vlozeneho na vstup nebo zapsaneho na vystup od posledni
+  kontroly prekroci checkVolume znaku (rostouci expanze jinak vycerpa pamet drive, nez probehne
+  checkInterval expanzi). Zacyklena rekurze maker expanduje neustale, je tedy vzdy zastavena. '''
+  
+  checkInterval = 1024
+  checkVolume = 1 << 20
+  
+  def __init__(self, expansions=None, pending=None, output=None, seconds=None):
+    self.maxExpansions = expansions
+    self.maxPending = pending
+    self.maxOutput = output
+    self.seconds = seconds
+    
+    self.start()
+    
+  @property
+  def limits(self):
+    ''' N-tice limitu ve stejnem poradi jako argumenty konstruktoru '''
+    return self.maxExpansions, self.maxPending, self.maxOutput, self.seconds
+    
+  def start(self):
+    ''' Vynuluje citace pred zacatkem zpracovani '''
+    self.expansions = 0
+    self.output = 0
+    self.pending = 0 # velikost nezpracovaneho vstupu po posledni expanzi
+    self.volume = 0 # objem textu od posledni kontroly casu
+    self.macro = None # naposledy expandovane makro
+    self.deadline = time.monotonic() + self.seconds if self.seconds is not None else None
+    
+  def expanded(self, name, pending):
+    ''' Zaznamena expanzi makra name, po ktere zbyva pending neprectenych znaku expanzi '''
+    self.macro = name
+    self.expansions += 1
+    
+    if self.maxExpansions is not None and self.expansions > self.maxExpansions:
+      raise ResourceLimitError('expansions', name,
+            "Expansion limit ({}) exceeded while expanding macro {}".format(self.maxExpansions, name))
+    
+    if self.maxPending is not None and pending > self.maxPending:
+      raise ResourceLimitError('pending', name,
+            "Pending input limit ({} chars) exceeded while expanding macro {}".format(self.maxPending, name))
+    
+    if self.deadline is not None:
+      # prirustek neprectenych expanzi je text vlozeny na vstup od minule expanze
+      if pending > self.pending:
+        self.volume += pending - self.pending
+      
+      self.pending = pending
       
-    return output
+      if self.volume >= self.checkVolume or not self.expansions % self.checkInterval:
+        self.checkTime()
+      
+  def wrote(self, length):
+    ''' Zaznamena zapis length znaku na vystup. Je volano pred zapisem, text, kterym by byl
+    limit prekrocen, tedy neni zapsan. '''
+    self.output += length
+    
+    if self.maxOutput is not None and self.output > self.maxOutput:
+      raise ResourceLimitError('output', self.macro,
+            "Output limit ({} chars) exceeded, last expanded macro: {}".format(self.maxOutput, self.macro))
+    
+    if self.deadline is not None:
+      self.volume += length
+      
+      if self.volume >= self.checkVolume:
+        self.checkTime()
+    
+  def checkTime(self):
+    ''' Overi, ze nevyprsel cas behu '''
+    self.volume = 0
+    
+    if time.monotonic() > self.deadline:
+      raise ResourceLimitError('time', self.macro,
+            "Time limit ({} s) exceeded while expanding macro {}".format(self.seconds, self.macro))
+    
  
+class ChunkFeed:
+  ''' Iterator useku vstupu, do ktereho jsou useky prubezne vkladany (feed). Dokud neni zdroj
+  uzavren (close), vyhazuje pri nedostatku useku InputUnderflow misto ukonceni iterace. '''
+  
+  def __init__(self):
+    self.chunks = collections.deque()
+    self.closed = False
+    
+  def feed(self, chunk):
+    self.chunks.append(chunk)
+    
+  def close(self):
+    self.closed = True
+    
+  def __iter__(self):
+    return self
+  
+  def __next__(self):
+    if self.chunks:
+      return self.chunks.popleft()
+    
+    if self.closed:
+      raise StopIteration
+    
+    raise InputUnderflow("Input chunk not available yet")
+  
+  
+class ListSink:
+  ''' Vystup makroprocesoru shromazdujici zapsane retezce v seznamu. '''
+  
+  def __init__(self):
+    self.chunks = []
+    
+  def write(self, string):
+    self.chunks.append(string)
+    
+  def flush(self):
+    pass
+  
+  def getvalue(self):
+    return ''.join(self.chunks)
+  
+  def drain(self):
+    ''' Vrati dosud zapsany text a vyprazdni buffer '''
+    text = ''.join(self.chunks)
+    self.chunks = []
+    
+    return text
+  
+  
+class FileSink(ListSink):
+  ''' Bufferovany vystup do souboru. Zapsane retezce shromazduje a po prekroceni velikosti
+  bufsize (ve znacich) je spoji a zapise do souboru, pamet je tak omezena velikosti bufferu.
+  Se zadanym kodovanim encoding je vystup zapisovan jako bajty do binarniho souboru. '''
+  
+  def __init__(self, fh, bufsize=65536, encoding=None):
+    ListSink.__init__(self)
+    self.fh = fh
+    self.bufsize = bufsize
+    self.encoding = encoding
+    self.size = 0
+    
+  def write(self, string):
+    self.chunks.append(string)
+    self.size += len(string)
+    
+    if self.size >= self.bufsize:
+      self.flush()
+      
+  def flush(self):
+    ''' Zapise shromazdeny vystup do souboru. Chybu zapisu vyhazuje jako OutputError, aby ji
+    bylo mozne odlisit od chyby cteni vstupu, ktery je take cten prubezne. '''
+    try:
+      if self.chunks:
+        data = ''.join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        self.fh.write(data if self.encoding is None else data.encode(self.encoding))
+      
+      self.fh.flush()
+    except OSError as err:
+      raise OutputError(err) from err
+    
+  
 class Scanner:
   ''' Lexikalni analyzator makroprocessoru, rozlisuje tri typy lexikalnich jednotek: znak, blok, nazev marka '''
-
+  
+  # usek obycejneho textu, ktery neobsahuje zadny ridici znak
+  re_text = re.compile(r'[^@{}$]+')
+  re_special = re.compile(r'[@{}$]')
+  re_space = re.compile(r'\s+') # odpovida presne znakum, pro ktere plati str.isspace()
+  re_block = re.compile(r'[{}@]') # znaky, ktere meni cteni bloku
+  
+  # tabulky znaku 0-255, ktere mohou byt soucasti jmena makra (str.isalnum() nebo podtrzitko)
+  # a bilych znaku (str.isspace(), vcetne \x1c-\x1f), vyssi znaky jsou urceny metodami str
+  wordChars = frozenset(chr(i) for i in range(256) if chr(i).isalnum() or i == ord('_'))
+  spaceChars = frozenset(chr(i) for i in range(256) if chr(i).isspace())
+  
   ( # definice stavu automatu
    s_idle,
    s_text,
@@ -244,9 +635,49 @@ class Scanner:
     ''' Nastavi analyzator do rezimu, kdy prijima bile znaky ''' 
     self.__ignoreWhitespace = False
     
+  @property
+  def whitespaceIgnored(self):
+    return self.__ignoreWhitespace
+    
+    
+  def literal(self, text):
+    ''' Vrati text bez ridicich znaku v podobe, v jake by jej analyzator predal na vystup,
+    tj. v rezimu ignorovani bilych znaku bez nich. '''
+    if self.__ignoreWhitespace:
+      return self.re_space.sub('', text)
+    
+    return text
+    
+  def getToken(self, bulk=False):
+    ''' Nacte a vrati lexikalni jednotku a jeji typ ze vstupu. Vraci None, pokud dorazi na konec souboru.
+    S parametrem bulk vraci cely usek obycejneho textu (az po nasledujici ridici znak) jako jednu
+    jednotku typu s_text. Takto lze cist pouze text urceny primo na vystup, argumenty maker jsou
+    jednotlive znaky. '''
     
-  def getToken(self):
-    ''' Nacte a vrati lexikalni jednotku a jeji typ ze vstupu. Vraci None, pokud dorazi na konec souboru '''
+    if bulk and not self.__ignoreWhitespace:
+      try:
+        text = self.content.getrun(self.re_text)
+      except IndexError:
+        return None
+      
+      if text:
+        return self.s_text, text
+    
+    # v rezimu ignorovani bilych znaku jsou preskoceny cele useky mezer (i pres hranice ramcu)
+    # a obycejny text je vracen najednou bez nich
+    if self.__ignoreWhitespace:
+      try:
+        while self.content.getrun(self.re_space):
+          pass
+        
+        if bulk:
+          text = self.content.getrun(self.re_text)
+          
+          if text:
+            return self.s_text, self.re_space.sub('', text)
+          
+      except IndexError:
+        return None
     
     state = self.s_idle
     blockCounter = 0
@@ -256,7 +687,7 @@ class Scanner:
       
       try:
         ch = self.content.getc()
-      except:
+      except IndexError:
         ch = None
         
       if state == self.s_idle:
@@ -266,6 +697,12 @@ class Scanner:
           buff += ch
         
         elif ch == '{':
+          # blok lezici cely v aktualnim ramci je vyriznut najednou
+          block = self.content.getblock(self.re_block)
+          
+          if block is not None:
+            return self.s_block, block
+          
           state = self.s_block_read
           blockCounter += 1
         
@@ -276,7 +713,7 @@ class Scanner:
           return None
         
         else:
-          if self.__ignoreWhitespace and ch.isspace():
+          if self.__ignoreWhitespace and (ch in self.spaceChars or ch > '\xff' and ch.isspace()):
             continue
           
           else:
@@ -291,7 +728,7 @@ class Scanner:
           buff = ch
           break
         
-        elif ch.isalnum() or ch == '_':
+        elif ch in self.wordChars or ch > '\xff' and ch.isalnum():
           state = self.s_macro
           buff += ch
         
@@ -338,7 +775,7 @@ class Scanner:
         if ch is None:
           break
                 
-        if ch.isalnum() or ch == '_':
+        if ch in self.wordChars or ch > '\xff' and ch.isalnum():
           buff += ch
           
         else:
@@ -349,58 +786,240 @@ class Scanner:
     return state, buff
 
            
-class ExtendableString:
-  ''' Retezec s moznosti nahrazeni podretezce jinym retezcem. Umoznuje take sekvencni cteni retezece.
-  Uchovava si ukazatel a aktualne cteny znak, po jeho precteni je ukazatel posunut na nasledujici znak.'''
+class InputStack:
+  ''' Vstup makroprocesoru organizovany jako zasobnik ramcu. Expanze makra se nevklada do zbytku
+  vstupu (coz by znamenalo kopii celeho dokumentu), ale ulozi se jako novy ramec na vrchol zasobniku.
+  Vlozeni expanze tak stoji pouze jeji delku. Ramce jsou cteny sekvencne, vycerpany ramec je
+  ze zasobniku odstranen. Dno zasobniku muze byt prubezne doplnovano z iteratoru useku vstupu.
+  
+  Stav vstupu lze oznacit (mark) a pozdeji se do nej vratit (rollback), napr. kdyz zdroj useku
+  vstupu vyhodi InputUnderflow. Po oznaceni jsou odstranene ramce a nactene useky zaznamenavany,
+  cteni tak zustava nedestruktivni. '''
   
-  def __init__(self, string):      
-    self.__content = string
+  def __init__(self, string, chunks=None):
+    self.__buff = string # aktualne cteny ramec
     self.__pointer = 0
+    self.__chunks = chunks # zdroj dalsich useku vstupu, None po jeho vycerpani
     
-    self.__backup = 0
+    self.__frames = [] # odlozene ramce ve tvaru (retezec, pozice cteci hlavy)
+    self.__stacked = 0 # pocet neprectenych znaku v odlozenych ramcich
+    self.__bottom = True # zda je aktualni ramec usekem vstupu (dnem zasobniku), ne expanzi
+    self.__base = 0 # pocet neprectenych znaku odlozeneho useku vstupu
+    
+    self.__returned = [] # useky vracene pri rollback, ctou se pred dalsimi useky (posledni prvni)
+    self.__marked = None # stav pri oznaceni
+    self.__log = None # ramce a useky odstranene od oznaceni
+    self.replayed = 0 # pocet znaku useku vstupu, ktere posledni rollback vratil ke cteni
     
   
   def getc(self):
-    ''' Nacte a vrati nasledujici znak z retezce (ridi se ukazatelem na aktualni znak). Pokud je na konci retezce
-    vraci hodnotu None. '''
-    ch = self.content[self.pointer]
+    ''' Nacte a vrati nasledujici znak ze vstupu. Vycerpane ramce jsou prubezne odstranovany,
+    na konci vstupu vyhazuje IndexError. '''
+    while self.__pointer >= len(self.__buff):
+      if not self.nextFrame():
+        raise IndexError("End of input")
+    
+    ch = self.__buff[self.__pointer]
     self.__pointer += 1
     
     return ch
   
-  def putback(self, n=1):
-    ''' Vrati N znaku zpet na vstup (posune cteci hlavu retezce o N znaku zpatky '''
-    self.__pointer -= n
+  def getrun(self, pattern):
+    ''' Nacte a vrati nejdelsi usek zacatku aktualniho ramce odpovidajici predkompilovanemu vzoru
+    pattern, pripadne prazdny retezec. Usek nikdy nepresahuje hranici ramce. Na konci vstupu
+    vyhazuje IndexError. '''
+    if not self.ready():
+      raise IndexError("End of input")
+      
+    match = pattern.match(self.__buff, self.__pointer)
     
-  def createBackup(self):
-    ''' Vytvori zalohu pozice cteci hlavy, aby bylo mozne se na tuto pozici vratit '''
-    self.__backup = self.pointer
+    if match is None:
+      return ''
     
-    return self.pointer
+    self.__pointer = match.end()
     
-  def doBackup(self):
-    ''' Vrati cteci hlavu na pozici posledni zalohy. '''
-    self.__pointer = self.__backup
+    return match.group()
   
-  def extend(self, string, from_, to):
-    ''' Na pozici cteci hlavy vsune novy podretezec, len urcuje delku nahrazovane sekvence'''
-    self.__content = self.content[:from_] + string + self.content[to:]
+  def getblock(self, pattern):
+    ''' Nacte obsah bloku od cteci hlavy (za oteviraci zavorkou) po jeho uzaviraci zavorku.
+    Obsah bez escape sekvenci je jedinym vyrezem ramce, escape sekvence {}@ jsou nahrazeny
+    znakem. Pattern vyhledava znaky {}@. Pokud blok nekonci v aktualnim ramci, vraci None
+    a cteci hlavu neposune. '''
+    buff = self.__buff
+    start = pos = self.__pointer
+    depth = 1
+    parts = None
+    
+    while True:
+      match = pattern.search(buff, pos)
+      
+      if match is None:
+        return None
+      
+      i = match.start()
+      ch = buff[i]
+      
+      if ch == '@':
+        if i + 1 >= len(buff):
+          return None
+        
+        # escapovany znak zacina dalsi vyrez, ostatni escape sekvence zustavaji v obsahu
+        if buff[i + 1] in '{}@':
+          if parts is None:
+            parts = []
+            
+          parts.append(buff[start:i])
+          start = i + 1
+          
+        pos = i + 2
+        
+      elif ch == '{':
+        depth += 1
+        pos = i + 1
+        
+      else:
+        depth -= 1
+        pos = i + 1
+        
+        if not depth:
+          self.__pointer = pos
+          
+          if parts is None:
+            return buff[start:i]
+          
+          parts.append(buff[start:i])
+          return ''.join(parts)
+    
+  def ready(self):
+    ''' Zajisti, aby aktualni ramec obsahoval neprecteny znak. Vraci False na konci vstupu. '''
+    while self.__pointer >= len(self.__buff):
+      if not self.nextFrame():
+        return False
+      
+    return True
+  
+  def nextFrame(self):
+    ''' Prejde na nasledujici ramec, pripadne nacte dalsi usek vstupu. Vraci False na konci vstupu. '''
+    if self.__frames:
+      frame = self.__frames.pop()
+      
+      if self.__log is not None:
+        self.__log.append(frame)
+      
+      self.__buff, self.__pointer = frame
+      self.__stacked -= len(self.__buff) - self.__pointer
+      
+      # usek vstupu je odlozen jen s neprectenymi znaky a vzdy jako prvni ramec
+      if self.__base and not self.__frames:
+        self.__base = 0
+        self.__bottom = True
+      
+      return True
+    
+    return self.refill()
+  
+  def refill(self):
+    ''' Nacte do prazdneho zasobniku dalsi usek vstupu. Vraci False, pokud jiz zadny neni. '''
+    if self.__returned:
+      chunk = self.__returned.pop()
+      
+    elif self.__chunks is None:
+      return False
+    
+    else:
+      chunk = next(self.__chunks, None)
+      
+      while chunk == '':
+        chunk = next(self.__chunks, None)
+        
+      if chunk is None:
+        self.__chunks = None
+        return False
+      
+    if self.__log is not None:
+      self.__log.append(chunk)
+    
+    self.__buff = chunk
+    self.__pointer = 0
+    self.__bottom = True
+    return True
+  
+  def mark(self):
+    ''' Oznaci aktualni stav vstupu, viz rollback '''
+    self.__marked = (self.__buff, self.__pointer, self.__stacked, self.__bottom, self.__base)
+    self.__log = []
+    
+  def rollback(self):
+    ''' Vrati vstup do stavu pri poslednim oznaceni. Ramce odstranene od oznaceni jsou vraceny
+    na zasobnik a nactene useky budou prectene znovu. '''
+    self.__buff, self.__pointer, self.__stacked, self.__bottom, self.__base = self.__marked
+    self.replayed = 0
+    
+    for entry in reversed(self.__log):
+      if type(entry) is str:
+        self.__returned.append(entry)
+        self.replayed += len(entry)
+      else:
+        self.__frames.append(entry)
+        
+    self.__log = []
+    
+  def putback(self, n=1):
+    ''' Vrati N znaku zpet na vstup (posune cteci hlavu aktualniho ramce o N znaku zpatky).
+    Vracene znaky musi pochazet z aktualniho ramce. '''
+    self.__pointer -= n
+  
+  def pushback(self, string):
+    ''' Vlozi retezec na zacatek zbyvajiciho vstupu jako novy ramec '''
+    if not string:
+      return
+    
+    if self.__pointer < len(self.__buff): # vycerpany ramec neni treba odkladat
+      self.__frames.append( (self.__buff, self.__pointer) )
+      self.__stacked += len(self.__buff) - self.__pointer
+      
+      if self.__bottom:
+        self.__base = len(self.__buff) - self.__pointer
+      
+    self.__buff = string
+    self.__pointer = 0
+    self.__bottom = False
+  
+  def advance(self, pointer):
+    ''' Presune cteci hlavu aktualniho ramce vpred na pozici pointer '''
+    self.__pointer = pointer
+    
+  def frame(self):
+    ''' Vrati dvojici (text, pozice cteci hlavy) ramce, ze ktereho bude cten nasledujici znak,
+    None na konci vstupu '''
+    while self.__pointer >= len(self.__buff):
+      if not self.nextFrame():
+        return None
+      
+    return self.__buff, self.__pointer
   
   @property
-  def content(self):
-    ''' pozor vyhazuje vyjimku '''
-    return self.__content
+  def pending(self):
+    ''' Pocet nactenych, ale dosud neprectenych znaku vstupu (vsech ramcu) '''
+    return self.__stacked + len(self.__buff) - self.__pointer
   
   @property
-  def pointer(self):
-    return self.__pointer
+  def pushed(self):
+    ''' Pocet dosud neprectenych znaku expanzi vlozenych na vstup, bez useku samotneho vstupu.
+    Na rozdil od pending nezavisi na tom, po jak velkych usecich je vstup cten. '''
+    current = 0 if self.__bottom else len(self.__buff) - self.__pointer
+    
+    return self.__stacked - self.__base + current
   
   @property
-  def backup(self):
-    return self.__backup
+  def content(self):
+    ''' Zbyvajici (neprecteny) obsah vstupu. Slouzi pouze pro ladeni, spojuje vsechny ramce. '''
+    parts = [self.__buff[self.__pointer:]]
+    
+    for buff, pointer in reversed(self.__frames):
+      parts.append(buff[pointer:])
+      
+    return ''.join(parts)
   
   def __str__(self):
     return self.content
-  
-  
-  
@@ -0,0 +1,94 @@
+#JMP:xkovar66
+''' Lexikalni analyzator rizeny regularnimi vyrazy (jmp.py --engine=regex). Kazda lexikalni
+jednotka je rozpoznana jedinym porovnanim predkompilovaneho vzoru na pozici cteci hlavy:
+escape sekvence, cele jmeno makra, mezera nebo znak. Blok je vyriznut najednou metodou
+InputStack.getblock, ktera hleda pouze zavorky a escape sekvence a pocita hloubku vnoreni.
+
+Vzory pracuji nad jednim ramcem vstupu. Jednotku, ktera muze pokracovat v dalsim ramci (jmeno
+makra nebo znak @ na konci ramce, blok neuzavreny v ramci), cte puvodni analyzator Scanner po
+znacich. Vracene jednotky i chyby jsou tedy shodne se Scanner. '''
+
+import re
+
+from processor import Scanner, IllegalCharSequenceError
+
+
+class RegexScanner(Scanner):
+  ''' Lexikalni analyzator rozpoznavajici jednotky regularnimi vyrazy '''
+  
+  # escape sekvence, jmeno makra, samotny znak @, zacatek bloku, znaky, ktere musi byt escapovany,
+  # bile znaky a ostatni znaky; \w odpovida presne znakum, pro ktere plati str.isalnum(), a podtrzitku
+  re_lexeme = re.compile(r'@([{}@$])|@(\w+)|(@)|(\{)|([}$])|(\s+)|(.)', re.S)
+  
+  def getToken(self, bulk=False):
+    content = self.content
+    ignore = self.whitespaceIgnored
+    
+    while True:
+      frame = content.frame()
+      
+      if frame is None:
+        return None
+      
+      buff, pointer = frame
+      
+      # obycejny text najednou, v rezimu ignorovani bez bilych znaku
+      if bulk:
+        match = self.re_text.match(buff, pointer)
+        
+        if match is not None:
+          content.advance(match.end())
+          
+          if not ignore:
+            return self.s_text, match.group()
+          
+          text = self.re_space.sub('', match.group())
+          
+          if text:
+            return self.s_text, text
+          
+          continue
+      
+      match = self.re_lexeme.match(buff, pointer)
+      escaped, name, at, block, illegal, space, char = match.groups()
+      end = match.end()
+      
+      if escaped is not None:
+        content.advance(end)
+        return self.s_char, escaped
+      
+      if name is not None:
+        if end == len(buff): # jmeno muze pokracovat v dalsim ramci
+          break
+        
+        content.advance(end)
+        return self.s_macro, '@' + name
+      
+      if at is not None:
+        if end == len(buff):
+          break
+        
+        raise IllegalCharSequenceError("Unknown escape sequence")
+      
+      if block is not None:
+        content.advance(end)
+        value = content.getblock(self.re_block)
+        
+        if value is not None:
+          return self.s_block, value
+        
+        # blok pokracuje v dalsim ramci
+        content.advance(pointer)
+        break
+      
+      if illegal is not None:
+        raise IllegalCharSequenceError("Char {} has to be escaped".format(illegal))
+      
+      if space is not None and ignore:
+        content.advance(end)
+        continue
+      
+      content.advance(pointer + 1)
+      return self.s_char, buff[pointer]
+    
+    return Scanner.getToken(self, bulk)
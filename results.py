@@ -0,0 +1,181 @@
+#JMP:xkovar66
+''' Trvala cache vysledku zpracovani celych dokumentu. Vystup zavisi pouze na textu vstupu,
+--cmd, priznaku -r a pripadne knihovne (makra nemaji pristup k prostredi ani k souborum),
+klicem polozky je tedy hash techto hodnot, limitu zdroju a razitka verze makroprocesoru. Pri zasahu je vracen
+ulozeny vystup nebo vyhozena ulozena chyba, aniz by byl vstup vubec lexikalne analyzovan.
+
+Polozky jsou soubory res-<klic>.json v adresari cache, zapisovane atomicky, cache tedy
+mohou sdilet soubezne bezici procesy. Polozka obsahuje pouze data (vystup, navratovy kod, nazev
+tridy a text chyby), jeji nacteni tedy nemuze spustit kod ani v adresari, do ktereho muze
+zapisovat nekdo jiny. Celkova velikost je omezena, pri jejim prekroceni jsou odstraneny nejdele
+nepouzite polozky (podle casu posledni zmeny, ktery zasah obnovuje). '''
+
+import hashlib
+import json
+import os
+
+import config
+import library
+import macro
+import processor
+
+
+# tridy chyb, jejichz vysledek lze ulozit (viz cacheable): nazev -> trida
+ERRORS = {cls.__name__: cls for cls in (processor.BlockNotClosedError, processor.IllegalCharSequenceError,
+                                        SyntaxError, macro.UnknownMacroError, macro.ArgumentsError,
+                                        macro.MacroNotDefinedError, macro.IllegalMacroRedefinition)}
+
+
+class ResultCache:
+  ''' Adresar cache vysledku o nejvetsi velikosti maxSize bajtu '''
+  
+  def __init__(self, directory, maxSize=256 << 20):
+    self.directory = directory
+    self.maxSize = maxSize
+    self.stamp = library.codeStamp()
+    
+    # odhad celkove velikosti polozek: zjisten pri prvnim zapisu, dale zvysovan o zapsane
+    # polozky; adresar je prochazen znovu az po prekroceni maxSize a polozky jsou pak odstraneny
+    # az na ctvrtinovou rezervu, prochazeni je tedy nejvyse jednou za zapis ctvrtiny maxSize
+    self.total = None
+  
+  def key(self, text, cmd="", restrict=False, lib=None, limits=None):
+    ''' Vrati klic vysledku zpracovani textu s volbami cmd, restrict, knihovnou lib a n-tici
+    limitu zdroju limits (viz processor.Governor.limits) '''
+    digest = hashlib.sha256()
+    
+    # kazda cast je uvozena svou delkou, ruzne vstupy tak nemohou dat stejnou posloupnost bajtu
+    for part in (self.stamp, '-r' if restrict else '--', lib.key if lib is not None else '',
+                 repr(limits) if limits is not None else '', cmd, text):
+      data = part.encode('utf-8', 'surrogatepass')
+      digest.update(len(data).to_bytes(8, 'big'))
+      digest.update(data)
+    
+    return digest.hexdigest()
+  
+  def path(self, key):
+    return os.path.join(self.directory, 'res-' + key + '.json')
+  
+  def get(self, key):
+    ''' Vrati ulozenou dvojici (vystup, vyjimka nebo None), None pokud polozka neexistuje nebo
+    je poskozena '''
+    path = self.path(key)
+    
+    try:
+      with open(path, 'rb') as f:
+        entry = json.loads(f.read().decode('utf-8'))
+      
+      output = entry['output']
+      error = None
+      
+      if entry['code']:
+        error = ERRORS[entry['error']](entry['message'])
+      
+      if not isinstance(output, str):
+        return None
+    except Exception:
+      return None
+    
+    # zasah obnovi cas posledniho pouziti polozky
+    try:
+      os.utime(path)
+    except OSError:
+      pass
+    
+    return output, error
+  
+  def put(self, key, output, error=None):
+    ''' Ulozi vysledek zpracovani a pri prekroceni limitu velikosti odstrani nejstarsi polozky.
+    Chyba pri zapisu neni fatalni, vysledek pouze neni ulozen. '''
+    entry = {'output': output, 'code': 0, 'error': None, 'message': None}
+    
+    if error is not None:
+      entry.update(code=config.errorCode(error), error=type(error).__name__, message=str(error))
+    
+    data = json.dumps(entry).encode('utf-8')
+    
+    try:
+      library.writeAtomic(self.path(key), data)
+      
+      # zapisy jinych procesu odhad nezahrnuje, limit tak muze byt prekrocen nejvyse o ne
+      if self.total is None or self.total + len(data) > self.maxSize:
+        self.total = self.evict(self.maxSize - self.maxSize // 4)
+      else:
+        self.total += len(data)
+    except Exception:
+      pass
+  
+  def evict(self, limit=None):
+    ''' Odstrani nejdele nepouzite polozky, dokud celkova velikost presahuje limit (implicitne
+    maxSize). Vraci celkovou velikost zbylych polozek. '''
+    if limit is None:
+      limit = self.maxSize
+    
+    entries = []
+    total = 0
+    
+    with os.scandir(self.directory) as it:
+      for entry in it:
+        if not entry.name.startswith('res-'):
+          continue
+        
+        try:
+          info = entry.stat()
+        except OSError: # polozku mezitim odstranil jiny proces
+          continue
+        
+        entries.append( (info.st_mtime, info.st_size, entry.path) )
+        total += info.st_size
+    
+    entries.sort()
+    
+    for mtime, size, path in entries:
+      if total <= limit:
+        break
+      
+      try:
+        os.unlink(path)
+      except OSError:
+        pass
+      
+      total -= size
+    
+    return total
+
+
+def cacheable(err):
+  ''' Zda lze ulozit vysledek zpracovani skoncene vyjimkou err. Chyby cteni a limity zdroju
+  (cas behu, limity z prikazove radky) nezavisi jen na vstupu, ukladany nejsou. '''
+  return ERRORS.get(type(err).__name__) is type(err)
+
+
+def process(proc, cache):
+  ''' Zpracuje vstup nacteny procesorem proc s pouzitim cache vysledku. Vraci vystup, chybu
+  zpracovani (i ulozenou v cache) vyhazuje. Vstup je pro vypocet klice nejprve cely nacten. '''
+  text = ''.join(proc.contents)
+  
+  # uspesny vysledek behu bez limitu nelze pouzit pro beh, ktery by limit prekrocil
+  limits = proc.governor.limits if proc.governor is not None else None
+  key = cache.key(text, proc.cfg['cmd'], proc.cfg['r'], proc.library, limits)
+  
+  entry = cache.get(key)
+  
+  if entry is None:
+    proc.readText(text)
+    
+    try:
+      entry = proc.process(), None
+    except Exception as err:
+      if not cacheable(err):
+        raise
+      
+      entry = '', err
+    
+    cache.put(key, *entry)
+  
+  output, error = entry
+  
+  if error is not None:
+    raise error
+  
+  return output
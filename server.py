@@ -0,0 +1,135 @@
+#JMP:xkovar66
+''' Server makroprocesoru. Dlouho bezici proces prijima pozadavky na zpracovani (vstupni text,
+--cmd, priznak -r) pres lokalni Unix socket a vraci vystup spolu s navratovym kodem shodnym
+s jmp.py. Pozadavky zpracovava fond predem spustenych procesu, ve kterych jsou moduly
+makroprocesoru (a pripadne knihovna maker) jiz nacteny. Kazdy pozadavek dostava vlastni
+tabulku maker. Protokol zprav je definovan v modulu jmpc.
+'''
+
+import os
+import signal
+import socket
+import stat
+import sys
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import api
+import config
+import jmpc
+import library
+
+
+# stav pracovniho procesu
+libraryPath = None
+limits = None # limity zdroju kazdeho pozadavku
+libraries = {} # priznak -r -> knihovna
+
+
+def initWorker(path, requestLimits):
+  ''' Inicializace pracovniho procesu, knihovna je nactena predem '''
+  global libraryPath, limits
+  libraryPath = path
+  limits = requestLimits
+  
+  # preruseni obsluhuje hlavni proces serveru
+  signal.signal(signal.SIGINT, signal.SIG_IGN)
+  
+  if path:
+    getLibrary(False)
+
+
+def getLibrary(restrict):
+  ''' Vrati knihovnu maker, pozadavky ji sdileji (kazdy pracuje s vlastni vetvi jeji tabulky) '''
+  lib = libraries.get(restrict)
+  
+  if lib is None:
+    lib = libraries[restrict] = library.loadLibrary(libraryPath, restrict)
+    
+  return lib
+
+
+def handleRequest(request):
+  ''' Zpracuje jeden pozadavek v pracovnim procesu, vraci odpoved serveru '''
+  restrict = bool(request.get('r'))
+  lib = None
+  
+  if libraryPath:
+    try:
+      lib = getLibrary(restrict)
+    except Exception as err:
+      return {'output': '', 'code': config.errorCode(err) or config.READ_FILE_ERR,
+              'error': "{}: {}".format(libraryPath, err)}
+    
+  output, code, message = api.processText(request.get('input', ''), request.get('cmd', ''), restrict, lib, limits)
+  
+  return {'output': output, 'code': code, 'error': message}
+
+
+def handleConnection(conn, pool):
+  ''' Obsluha jednoho klienta, na spojeni muze poslat libovolny pocet pozadavku '''
+  with conn:
+    while True:
+      try:
+        request = jmpc.recvMessage(conn)
+      except (OSError, ValueError):
+        return
+      
+      if request is None:
+        return
+      
+      try:
+        response = pool.submit(handleRequest, request).result()
+      except Exception as err:
+        response = {'output': '', 'code': 1, 'error': "{}: {}".format(type(err).__name__, err)}
+        
+      try:
+        jmpc.sendMessage(conn, response)
+      except OSError:
+        return
+
+
+def removeSocket(path):
+  ''' Odstrani zbyly socket predchoziho behu serveru (jiny soubor neodstranuje) '''
+  try:
+    if stat.S_ISSOCK(os.stat(path).st_mode):
+      os.unlink(path)
+  except FileNotFoundError:
+    pass
+    
+    
+def serve(path, libraryPath=None, workers=None, limits=None):
+  ''' Spusti server na Unix socketu path. Bezi do preruseni (SIGINT nebo SIGTERM). Limity zdroju
+  (n-tice argumentu processor.Governor) plati pro kazdy pozadavek zvlast. '''
+  signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+  
+  if workers is None:
+    workers = os.cpu_count() or 1
+    
+  pool = ProcessPoolExecutor(max_workers=workers, initializer=initWorker, initargs=(libraryPath, limits))
+  clients = ThreadPoolExecutor(max_workers=workers * 4)
+  
+  # nahrej pracovni procesy predem, prvni pozadavky tak neplati jejich start
+  for future in [pool.submit(os.getpid) for i in range(workers)]:
+    future.result()
+  
+  removeSocket(path)
+  
+  sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  
+  try:
+    sock.bind(path)
+    sock.listen(128)
+    
+    while True:
+      conn, addr = sock.accept()
+      clients.submit(handleConnection, conn, pool)
+      
+  except KeyboardInterrupt:
+    pass
+  
+  finally:
+    sock.close()
+    removeSocket(path)
+    clients.shutdown(wait=False)
+    pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,78 @@
+#JMP:xkovar66
+
+import json
+import time
+
+
+class Stats:
+  ''' Statistiky behu makroprocesoru. Pro kazde makro (podle jmena, pod kterym bylo zavolano)
+  zaznamenava pocet expanzi, celkovy cas expanze vcetne cteni argumentu, delku expandovaneho
+  textu a delku textu vraceneho na vstup k opetovnemu zpracovani. Dale sleduje velikost
+  dosud nezpracovaneho vstupu po kazde expanzi. '''
+  
+  clock = staticmethod(time.perf_counter)
+  
+  def __init__(self):
+    self.macros = {} # jmeno -> [pocet, cas, expandovano, znovu cteno]
+    
+    self.pendingPeak = 0
+    self.pendingSum = 0
+    self.samples = 0
+    
+  def record(self, name, seconds, expanded, rescanned, pending):
+    ''' Zaznamena jednu expanzi makra '''
+    entry = self.macros.get(name)
+    
+    if entry is None:
+      entry = self.macros[name] = [0, 0.0, 0, 0]
+      
+    entry[0] += 1
+    entry[1] += seconds
+    entry[2] += expanded
+    entry[3] += rescanned
+    
+    if pending > self.pendingPeak:
+      self.pendingPeak = pending
+      
+    self.pendingSum += pending
+    self.samples += 1
+    
+  def report(self):
+    ''' Vrati statistiky jako slovnik vhodny pro serializaci do JSON '''
+    macros = {}
+    
+    for name, (count, seconds, expanded, rescanned) in self.macros.items():
+      macros[name] = {
+        'count'    : count,
+        'seconds'  : seconds,
+        'expanded' : expanded,
+        'rescanned': rescanned,
+      }
+      
+    return {
+      'macros'       : macros,
+      'expansions'   : self.samples,
+      'seconds'      : sum(entry[1] for entry in self.macros.values()),
+      'pending_peak' : self.pendingPeak,
+      'pending_mean' : self.pendingSum / self.samples if self.samples else 0,
+    }
+  
+  def json(self):
+    return json.dumps(self.report(), indent=2, sort_keys=True)
+  
+  def table(self):
+    ''' Vrati statistiky jako textovou tabulku serazenou sestupne podle celkoveho casu '''
+    rows = sorted(self.macros.items(), key=lambda item: item[1][1], reverse=True)
+    
+    s  = "{:<24} {:>10} {:>12} {:>12} {:>12}\n".format('macro', 'count', 'seconds', 'expanded', 'rescanned')
+    
+    for name, (count, seconds, expanded, rescanned) in rows:
+      s += "{:<24} {:>10} {:>12.6f} {:>12} {:>12}\n".format(name, count, seconds, expanded, rescanned)
+    
+    s += "pending input: peak {} chars, mean {:.1f} chars over {} expansions\n".format(
+          self.pendingPeak, self.pendingSum / self.samples if self.samples else 0, self.samples)
+    
+    return s
+  
+  def __str__(self):
+    return self.table()
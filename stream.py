@@ -0,0 +1,87 @@
+#JMP:xkovar66
+''' Proudove zpracovani mnoha dokumentu jednim behem programu (jmp.py --stream). Kazdy radek
+standardniho vstupu je jeden pozadavek ve formatu JSON Lines:
+  
+  {"input": "text dokumentu", "cmd": "text vlozeny pred vstup"}
+
+Na kazdy pozadavek je na standardni vystup zapsan jeden radek odpovedi se stejnymi klici jako
+odpoved serveru: {"output": ..., "code": ..., "error": ...}. Navratovy kod odpovida samostatnemu
+behu jmp.py, chybny format pozadavku ma kod 1. Chybi-li v pozadavku cmd, plati --cmd.
+
+Vsechny dokumenty zpracovava jedina instance tridy Processor. Pred kazdym dokumentem dostane
+novou vetev snimku tabulky maker porizeneho pred prvnim dokumentem (po zpracovani knihovny),
+definice jednoho dokumentu se tedy do dalsich neprenaseji. Pozadavky jsou cteny a odpovedi
+zapisovany po jednom, pamet je omezena velikosti jednoho pozadavku a jeho odpovedi. '''
+
+import json
+import sys
+
+import api
+import config
+
+
+def parseRequest(line, cmd=""):
+  ''' Vrati dvojici (vstup, cmd) z radku pozadavku, pri chybnem formatu vyhazuje ValueError '''
+  request = json.loads(line)
+  
+  if not isinstance(request, dict):
+    raise ValueError("Request has to be a JSON object")
+  
+  text = request.get('input', '')
+  cmd = request.get('cmd', cmd)
+  
+  if not isinstance(text, str) or not isinstance(cmd, str):
+    raise ValueError("Values of input and cmd have to be strings")
+  
+  return text, cmd
+
+
+def handleRequest(proc, baseline, line, cmd=""):
+  ''' Zpracuje jeden radek pozadavku procesorem proc s vetvi tabulky maker baseline, vraci
+  slovnik odpovedi '''
+  try:
+    text, proc.cfg['cmd'] = parseRequest(line, cmd)
+  except ValueError as err:
+    return {'output': '', 'code': config.INVALID_ARG_ERR, 'error': "Invalid request: {}".format(err)}
+  
+  proc.macroTable = baseline.fork()
+  proc.readText(text)
+  
+  output, code, message = api.runText(proc)
+  
+  return {'output': output, 'code': code, 'error': message}
+
+
+def stream(proc, infile, outfile, cmd=""):
+  ''' Zpracuje pozadavky z binarniho souboru infile a odpovedi zapisuje do binarniho souboru
+  outfile. Tabulka maker procesoru proc (pripadne po pouziti knihovny) je vychozim stavem
+  kazdeho dokumentu. Vraci navratovy kod programu. '''
+  baseline = proc.macroTable.fork()
+  lines = iter(infile)
+  
+  while True:
+    try:
+      line = next(lines, None)
+    except KeyboardInterrupt:
+      break
+    except OSError as err:
+      print(err, file=sys.stderr)
+      return config.READ_FILE_ERR
+    
+    if line is None:
+      break
+    
+    if not line.strip(): # prazdne radky oddeluji pozadavky, nejsou jimi
+      continue
+    
+    response = handleRequest(proc, baseline, line, cmd)
+    
+    # odpoved je odeslana hned, protistrana na ni muze cekat pred zaslanim dalsiho pozadavku
+    try:
+      outfile.write(json.dumps(response).encode('ascii') + b'\n')
+      outfile.flush()
+    except OSError as err:
+      print(err, file=sys.stderr)
+      return config.WRITE_FILE_ERR
+  
+  return 0